@@ -5,10 +5,126 @@ import io
 import os
 import tempfile
 import shutil
+import hashlib
+import json
 
 # Importar tu clase InventoryAnalyzer
 from script_analisis import InventoryAnalyzer
 
+
+def hash_archivo(archivo):
+    """SHA-1 del contenido de un archivo subido (memorizado en la sesión por file_id)"""
+    hashes = st.session_state.setdefault('hashes_archivos', {})
+    clave = getattr(archivo, 'file_id', archivo.name)
+    if clave not in hashes:
+        hashes[clave] = hashlib.sha1(archivo.getvalue()).hexdigest()
+    return hashes[clave]
+
+
+# Valores del slider de factor (para el barrido de alertas)
+FACTORES_SLIDER = [round(0.1 * i, 1) for i in range(1, 21)]
+
+
+def ejecutar_con_analizador(funcion, **config):
+    """
+    Crea un InventoryAnalyzer con una carpeta de salida temporal, ejecuta
+    funcion(analyzer) y recoge el log generado
+    
+    Returns:
+        Tupla (valor devuelto por funcion, contenido del log)
+    """
+    # Solo el log va a disco: los archivos se leen directamente de los buffers subidos
+    temp_output = tempfile.mkdtemp()
+    
+    try:
+        analyzer = InventoryAnalyzer(output_folder=temp_output, usar_cache_dialectos=False, **config)
+        valor = funcion(analyzer)
+        
+        log_content = ''
+        log_files = [f for f in os.listdir(temp_output) if f.endswith('.log')]
+        if log_files:
+            with open(os.path.join(temp_output, log_files[0]), 'r', encoding='utf-8') as f:
+                log_content = f.read()
+        
+        return valor, log_content
+    
+    finally:
+        shutil.rmtree(temp_output, ignore_errors=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=10)
+def cargar_variaciones_inventario(hashes_archivos, _archivos, incluir_fines_semana,
+                                  fecha_inicio=None, fecha_fin=None):
+    """
+    Etapas de carga y variaciones sobre los archivos subidos
+    
+    Streamlit cachea el resultado por el hash del contenido de los archivos, los
+    fines de semana y el rango (_archivos no forma parte de la clave). La
+    configuración de stock mínimo no interviene, así que moverla no repite la lectura
+    
+    Returns:
+        Tupla (df_variaciones, dias_faltantes, eventos de reabastecimiento, perfil de la carga,
+        contenido del log)
+    """
+    if fecha_inicio and fecha_fin:
+        fecha_inicio_analisis = datetime.combine(fecha_inicio, datetime.min.time())
+        fecha_fin_analisis = datetime.combine(fecha_fin, datetime.min.time())
+        dias_hasta_lunes = fecha_inicio_analisis.weekday()
+        semana_inicio = fecha_inicio_analisis - timedelta(days=dias_hasta_lunes)
+    else:
+        semana_inicio = None
+        fecha_inicio_analisis = None
+        fecha_fin_analisis = None
+    
+    (df_variaciones, dias_faltantes, reabastecimientos, perfil), log_content = ejecutar_con_analizador(
+        lambda analyzer: analyzer.cargar_variaciones(
+            semana_inicio=semana_inicio,
+            fecha_inicio_filtro=fecha_inicio_analisis,
+            fecha_fin_filtro=fecha_fin_analisis
+        ) + (analyzer.reabastecimientos, analyzer.perfil),
+        archivos={archivo.name: archivo.getvalue() for archivo in _archivos},
+        incluir_fines_semana=incluir_fines_semana
+    )
+    return df_variaciones, dias_faltantes, reabastecimientos, perfil, log_content
+
+
+@st.cache_data(show_spinner=False, max_entries=50)
+def calcular_resultado(clave_carga, _df_variaciones, dias_faltantes, usar_promedio_semanal,
+                       factor_promedio, stock_minimo_global, _reabastecimientos=None):
+    """
+    Etapas de alertas y reporte sobre las variaciones memorizadas (clave_carga
+    identifica las variaciones y sus reabastecimientos; los argumentos con _ no
+    forman parte de la clave)
+    
+    Returns:
+        Tupla (ResultadoAnalisis, contenido del log)
+    """
+    return ejecutar_con_analizador(
+        lambda analyzer: analyzer.resultado_desde_variaciones(
+            _df_variaciones, dias_faltantes, reabastecimientos=_reabastecimientos
+        ),
+        usar_promedio_semanal=usar_promedio_semanal,
+        factor_promedio=factor_promedio,
+        stock_minimo_global=stock_minimo_global
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=10)
+def calcular_barrido(clave_carga, _df_variaciones, stock_minimo_global):
+    """
+    Conteo de productos por estado para cada valor del slider de factor
+    
+    Returns:
+        DataFrame indexado por factor_promedio con una columna por estado
+    """
+    barrido, _ = ejecutar_con_analizador(
+        lambda analyzer: analyzer.barrido_alertas(_df_variaciones, FACTORES_SLIDER),
+        usar_promedio_semanal=True,
+        stock_minimo_global=stock_minimo_global
+    )
+    return barrido
+
+
 st.set_page_config(
     page_title="Análisis de Inventario - Dispensadora",
     page_icon="💊",
@@ -117,301 +233,292 @@ if archivos_subidos:
     with col2:
         procesar = st.button("🚀 Analizar Inventario", type="primary", use_container_width=True)
     
+    hashes_archivos = tuple(hash_archivo(archivo) for archivo in archivos_subidos)
+    if modo_analisis == "Rango de fechas personalizado":
+        rango_fechas = (fecha_inicio, fecha_fin)
+    else:
+        rango_fechas = (None, None)
+    clave_carga = (hashes_archivos, incluir_fines_semana) + rango_fechas
+    
     if procesar:
         if len(archivos_subidos) < 3:
             st.error("❌ Se requieren al menos 3 archivos para realizar el análisis")
         else:
-            temp_dir = tempfile.mkdtemp()
-            temp_input = os.path.join(temp_dir, 'inventarios')
-            temp_output = os.path.join(temp_dir, 'reportes')
-            os.makedirs(temp_input, exist_ok=True)
-            os.makedirs(temp_output, exist_ok=True)
+            if rango_fechas[0]:
+                st.info(f"📅 Analizando desde {fecha_inicio.strftime('%d/%m/%Y')} hasta {fecha_fin.strftime('%d/%m/%Y')}")
             
             try:
-                with st.spinner("📂 Guardando archivos..."):
-                    for archivo in archivos_subidos:
-                        ruta_archivo = os.path.join(temp_input, archivo.name)
-                        with open(ruta_archivo, 'wb') as f:
-                            f.write(archivo.getbuffer())
-                
                 with st.spinner("🔄 Procesando datos..."):
-                    analyzer = InventoryAnalyzer(
-                        input_folder=temp_input,
-                        output_folder=temp_output,
-                        incluir_fines_semana=incluir_fines_semana,
-                        stock_minimo_global=stock_minimo_global,
-                        usar_promedio_semanal=usar_promedio_semanal,
-                        factor_promedio=factor_promedio
-                    )
-                    
-                    if modo_analisis == "Rango de fechas personalizado":
-                        fecha_inicio_analisis = datetime.combine(fecha_inicio, datetime.min.time())
-                        fecha_fin_analisis = datetime.combine(fecha_fin, datetime.min.time())
-                        dias_hasta_lunes = fecha_inicio_analisis.weekday()
-                        semana_inicio = fecha_inicio_analisis - timedelta(days=dias_hasta_lunes)
-                        st.info(f"📅 Analizando desde {fecha_inicio.strftime('%d/%m/%Y')} hasta {fecha_fin.strftime('%d/%m/%Y')}")
-                    else:
-                        semana_inicio = None
-                        fecha_inicio_analisis = None
-                        fecha_fin_analisis = None
-                    
-                    archivo_reporte = analyzer.ejecutar_analisis_completo(
-                        semana_inicio=semana_inicio,
-                        fecha_inicio_filtro=fecha_inicio_analisis,
-                        fecha_fin_filtro=fecha_fin_analisis
+                    df_variaciones, dias_faltantes, reabastecimientos, perfil_carga, log_content = cargar_variaciones_inventario(
+                        hashes_archivos, archivos_subidos, incluir_fines_semana, *rango_fechas
                     )
-                    
-                    try:
-                        df_reporte = pd.read_excel(archivo_reporte, sheet_name='Reporte Semanal')
-                        df_resumen = pd.read_excel(archivo_reporte, sheet_name='Resumen')
-                    except Exception as e:
-                        st.error(f"Error al leer el archivo Excel: {str(e)}")
-                        raise
-                
-                st.success("✅ Análisis completado exitosamente")
-                
-                def obtener_metrica(df_resumen, nombre_metrica, default=0):
-                    try:
-                        resultado = df_resumen[df_resumen['Métrica'] == nombre_metrica]['Valor'].values
-                        if len(resultado) > 0:
-                            valor = resultado[0]
-                            if isinstance(valor, str) and 'unidades' in valor:
-                                return valor.split()[0]
-                            return int(valor) if not isinstance(valor, str) else valor
-                        return default
-                    except:
-                        return default
+                st.session_state['analisis'] = {
+                    'clave': clave_carga,
+                    'variaciones': df_variaciones,
+                    'dias_faltantes': dias_faltantes,
+                    'reabastecimientos': reabastecimientos,
+                    'perfil': perfil_carga,
+                    'log': log_content
+                }
+            
+            except Exception as e:
+                st.error(f"❌ Error durante el análisis:")
+                st.exception(e)
                 
-                total_productos = obtener_metrica(df_resumen, 'Total Productos Analizados', 0)
-                sin_existencias = obtener_metrica(df_resumen, 'Productos Sin Existencias', 0)
-                bajo_stock = obtener_metrica(df_resumen, 'Productos con Bajo Stock', 0)
-                en_descenso = obtener_metrica(df_resumen, 'Productos En Descenso', 0)
-                normales = obtener_metrica(df_resumen, 'Productos Normales', 0)
-                revisar = obtener_metrica(df_resumen, 'Productos a Revisar (Posible Reabastecimiento)', 0)
-                total_reabastecer = obtener_metrica(df_resumen, 'Total Unidades a Reabastecer', '0 unidades')
+                with st.expander("Ver detalles técnicos del error"):
+                    import traceback
+                    st.code(traceback.format_exc())
+    
+    # Las variaciones se conservan entre recargas mientras no cambien los archivos,
+    # los fines de semana ni el rango; el stock mínimo solo recalcula las alertas
+    analisis = st.session_state.get('analisis')
+    if analisis is not None and analisis['clave'] != clave_carga:
+        st.info("ℹ️ Los archivos o el periodo cambiaron. Pulse **Analizar Inventario** para actualizar los resultados")
+    elif analisis is not None:
+        resultado, log_alertas = calcular_resultado(
+            clave_carga, analisis['variaciones'], analisis['dias_faltantes'],
+            usar_promedio_semanal, factor_promedio, stock_minimo_global,
+            analisis['reabastecimientos']
+        )
+        log_content = analisis['log'] + log_alertas
+        df_reporte = resultado.df_export
+        df_resumen = resultado.df_resumen
+        
+        st.success("✅ Análisis completado exitosamente")
+        
+        resumen = resultado.resumen
+        total_productos = resumen['total_productos']
+        sin_existencias = resumen['sin_existencias']
+        bajo_stock = resumen['bajo_stock']
+        en_descenso = resumen['en_descenso']
+        normales = resumen['normales']
+        revisar = resumen['revisar']
+        total_reabastecer = f"{resumen['total_reabastecer']:.0f} unidades"
+        
+        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+            "📊 Resumen", "🔴 Urgentes", "🔵 Revisar", 
+            "📈 Datos Completos", "📋 Log", "🔧 Debug"
+        ])
+        
+        with tab1:
+            st.subheader("📈 Resumen del Análisis")
+            
+            col1, col2, col3, col4, col5 = st.columns(5)
+            with col1:
+                st.metric("Total Productos", total_productos)
+            with col2:
+                st.metric("🔴 Sin Stock", sin_existencias, delta="¡Urgente!", delta_color="inverse")
+            with col3:
+                st.metric("🟠 Bajo Stock", bajo_stock, delta="Reabastecer")
+            with col4:
+                st.metric("🟡 En Descenso", en_descenso, delta="Monitorear")
+            with col5:
+                st.metric("🟢 Normales", normales, delta="OK", delta_color="normal")
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("🔵 A Revisar", revisar, delta="Posibles reabastecimientos")
+            with col2:
+                st.metric("📦 Total a Reabastecer", total_reabastecer)
+            with col3:
+                config_msg = f"{factor_promedio}x consumo" if usar_promedio_semanal else f"{stock_minimo_global} und"
+                st.metric("⚙️ Stock Mínimo", config_msg)
+            
+            st.divider()
+            st.subheader("📋 Información Detallada")
+            st.dataframe(df_resumen, use_container_width=True, hide_index=True)
+            
+            st.divider()
+            st.subheader("📊 Distribución de Estados")
+            
+            datos_grafico = pd.DataFrame({
+                'Estado': ['🔴 Sin Stock', '🟠 Bajo Stock', '🟡 En Descenso', '🟢 Normal', '🔵 Revisar'],
+                'Cantidad': [sin_existencias, bajo_stock, en_descenso, normales, revisar]
+            })
+            
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                st.bar_chart(datos_grafico.set_index('Estado'), height=300)
+            with col2:
+                st.dataframe(datos_grafico, use_container_width=True, hide_index=True)
+            
+            if usar_promedio_semanal:
+                st.divider()
+                st.subheader("🎚️ Alertas según el Factor del Consumo")
+                st.caption("Productos en cada estado para todos los valores del slider")
                 
-                if total_productos == 0:
-                    st.warning("⚠️ Calculando métricas directamente del reporte...")
-                    total_productos = len(df_reporte)
-                    sin_existencias = len(df_reporte[df_reporte['Estado'] == '🔴 SIN EXISTENCIAS'])
-                    bajo_stock = len(df_reporte[df_reporte['Estado'] == '🟠 BAJO STOCK'])
-                    en_descenso = len(df_reporte[df_reporte['Estado'] == '🟡 EN DESCENSO'])
-                    normales = len(df_reporte[df_reporte['Estado'] == '🟢 NORMAL'])
-                    revisar = len(df_reporte[df_reporte['Estado'].str.contains('REVISAR', na=False)])
-                    if 'Cantidad a Reabastecer' in df_reporte.columns:
-                        total_reabastecer = f"{df_reporte['Cantidad a Reabastecer'].sum():.0f} unidades"
+                barrido = calcular_barrido(clave_carga, analisis['variaciones'], stock_minimo_global)
+                st.line_chart(barrido, height=300)
+        
+        with tab2:
+            st.subheader("🔴🟠 Productos Urgentes")
+            
+            try:
+                df_urgentes = df_reporte[
+                    (df_reporte['Estado'] == '🔴 SIN EXISTENCIAS') | 
+                    (df_reporte['Estado'] == '🟠 BAJO STOCK')
+                ].copy()
+            except:
+                df_urgentes = df_reporte[
+                    df_reporte['Estado'].str.contains('SIN EXISTENCIAS|BAJO STOCK', case=False, na=False)
+                ].copy()
+            
+            if len(df_urgentes) > 0:
+                st.error(f"⚠️ {len(df_urgentes)} productos requieren atención INMEDIATA")
                 
-                tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-                    "📊 Resumen", "🔴 Urgentes", "🔵 Revisar", 
-                    "📈 Datos Completos", "📋 Log", "🔧 Debug"
-                ])
+                if 'Cantidad a Reabastecer' in df_urgentes.columns:
+                    total_unidades = df_urgentes['Cantidad a Reabastecer'].sum()
+                    st.metric("📦 Total unidades a reabastecer:", f"{total_unidades:.0f}")
                 
-                with tab1:
-                    st.subheader("📈 Resumen del Análisis")
-                    
-                    col1, col2, col3, col4, col5 = st.columns(5)
-                    with col1:
-                        st.metric("Total Productos", total_productos)
-                    with col2:
-                        st.metric("🔴 Sin Stock", sin_existencias, delta="¡Urgente!", delta_color="inverse")
-                    with col3:
-                        st.metric("🟠 Bajo Stock", bajo_stock, delta="Reabastecer")
-                    with col4:
-                        st.metric("🟡 En Descenso", en_descenso, delta="Monitorear")
-                    with col5:
-                        st.metric("🟢 Normales", normales, delta="OK", delta_color="normal")
-                    
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("🔵 A Revisar", revisar, delta="Posibles reabastecimientos")
-                    with col2:
-                        st.metric("📦 Total a Reabastecer", total_reabastecer)
-                    with col3:
-                        config_msg = f"{factor_promedio}x consumo" if usar_promedio_semanal else f"{stock_minimo_global} und"
-                        st.metric("⚙️ Stock Mínimo", config_msg)
-                    
-                    st.divider()
-                    st.subheader("📋 Información Detallada")
-                    st.dataframe(df_resumen, use_container_width=True, hide_index=True)
-                    
-                    st.divider()
-                    st.subheader("📊 Distribución de Estados")
-                    
-                    datos_grafico = pd.DataFrame({
-                        'Estado': ['🔴 Sin Stock', '🟠 Bajo Stock', '🟡 En Descenso', '🟢 Normal', '🔵 Revisar'],
-                        'Cantidad': [sin_existencias, bajo_stock, en_descenso, normales, revisar]
-                    })
-                    
-                    col1, col2 = st.columns([2, 1])
-                    with col1:
-                        st.bar_chart(datos_grafico.set_index('Estado'), height=300)
-                    with col2:
-                        st.dataframe(datos_grafico, use_container_width=True, hide_index=True)
+                columnas_mostrar = ['Código', 'Producto', 'Stock Final', 'Estado']
+                if 'Stock Mínimo' in df_urgentes.columns:
+                    columnas_mostrar.insert(3, 'Stock Mínimo')
+                if 'Cantidad a Reabastecer' in df_urgentes.columns:
+                    columnas_mostrar.insert(4, 'Cantidad a Reabastecer')
                 
-                with tab2:
-                    st.subheader("🔴🟠 Productos Urgentes")
-                    
-                    try:
-                        df_urgentes = df_reporte[
-                            (df_reporte['Estado'] == '🔴 SIN EXISTENCIAS') | 
-                            (df_reporte['Estado'] == '🟠 BAJO STOCK')
-                        ].copy()
-                    except:
-                        df_urgentes = df_reporte[
-                            df_reporte['Estado'].str.contains('SIN EXISTENCIAS|BAJO STOCK', case=False, na=False)
-                        ].copy()
-                    
-                    if len(df_urgentes) > 0:
-                        st.error(f"⚠️ {len(df_urgentes)} productos requieren atención INMEDIATA")
-                        
-                        if 'Cantidad a Reabastecer' in df_urgentes.columns:
-                            total_unidades = df_urgentes['Cantidad a Reabastecer'].sum()
-                            st.metric("📦 Total unidades a reabastecer:", f"{total_unidades:.0f}")
-                        
-                        columnas_mostrar = ['Código', 'Producto', 'Stock Final', 'Estado']
-                        if 'Stock Mínimo' in df_urgentes.columns:
-                            columnas_mostrar.insert(3, 'Stock Mínimo')
-                        if 'Cantidad a Reabastecer' in df_urgentes.columns:
-                            columnas_mostrar.insert(4, 'Cantidad a Reabastecer')
-                        
-                        st.dataframe(df_urgentes[columnas_mostrar], use_container_width=True, hide_index=True, height=400)
-                        
-                        csv_urgentes = df_urgentes.to_csv(index=False).encode('utf-8')
-                        st.download_button(
-                            label="📥 Descargar Productos Urgentes (CSV)",
-                            data=csv_urgentes,
-                            file_name=f'productos_urgentes_{datetime.now().strftime("%Y%m%d_%H%M")}.csv',
-                            mime='text/csv',
-                        )
-                    else:
-                        st.success("✅ ¡Excelente! No hay productos en estado urgente")
+                st.dataframe(df_urgentes[columnas_mostrar], use_container_width=True, hide_index=True, height=400)
                 
-                with tab3:
-                    st.subheader("🔵 Productos para Revisar")
-                    
-                    df_revisar = df_reporte[df_reporte['Posible Reabastecimiento'] == True].copy()
-                    
-                    if len(df_revisar) > 0:
-                        st.info(f"ℹ️ {len(df_revisar)} productos con posible reabastecimiento")
-                        st.markdown("**¿Qué significa?** El stock aumentó - verificar si hubo entrada de mercancía")
-                        
-                        st.dataframe(df_revisar, use_container_width=True, hide_index=True, height=400)
-                        
-                        csv_revisar = df_revisar.to_csv(index=False).encode('utf-8')
-                        st.download_button(
-                            label="📥 Descargar Productos a Revisar (CSV)",
-                            data=csv_revisar,
-                            file_name=f'productos_revisar_{datetime.now().strftime("%Y%m%d_%H%M")}.csv',
-                            mime='text/csv',
-                        )
-                    else:
-                        st.success("✅ No hay productos con posible reabastecimiento")
+                csv_urgentes = df_urgentes.to_csv(index=False).encode('utf-8')
+                st.download_button(
+                    label="📥 Descargar Productos Urgentes (CSV)",
+                    data=csv_urgentes,
+                    file_name=f'productos_urgentes_{datetime.now().strftime("%Y%m%d_%H%M")}.csv',
+                    mime='text/csv',
+                )
+            else:
+                st.success("✅ ¡Excelente! No hay productos en estado urgente")
+        
+        with tab3:
+            st.subheader("🔵 Productos para Revisar")
+            
+            df_revisar = df_reporte[df_reporte['Posible Reabastecimiento'] == True].copy()
+            
+            if len(df_revisar) > 0:
+                st.info(f"ℹ️ {len(df_revisar)} productos con posible reabastecimiento")
+                st.markdown("**¿Qué significa?** El stock aumentó - verificar si hubo entrada de mercancía")
                 
-                with tab4:
-                    st.subheader("📋 Reporte Completo de Inventario")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        filtro_estado = st.multiselect(
-                            "Filtrar por estado:",
-                            options=df_reporte['Estado'].unique(),
-                            default=df_reporte['Estado'].unique()
-                        )
-                    with col2:
-                        buscar_producto = st.text_input("🔍 Buscar producto:", "")
-                    
-                    df_filtrado = df_reporte[df_reporte['Estado'].isin(filtro_estado)]
-                    if buscar_producto:
-                        df_filtrado = df_filtrado[
-                            df_filtrado['Producto'].str.contains(buscar_producto, case=False, na=False) |
-                            df_filtrado['Código'].str.contains(buscar_producto, case=False, na=False)
-                        ]
-                    
-                    st.caption(f"Mostrando {len(df_filtrado)} de {len(df_reporte)} productos")
-                    st.dataframe(df_filtrado, use_container_width=True, hide_index=True, height=500)
-                    
-                    st.divider()
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        csv = df_filtrado.to_csv(index=False).encode('utf-8')
-                        st.download_button(
-                            label="📥 Descargar Reporte (CSV)",
-                            data=csv,
-                            file_name=f'reporte_inventario_{datetime.now().strftime("%Y%m%d_%H%M")}.csv',
-                            mime='text/csv',
-                            use_container_width=True
-                        )
-                    
-                    with col2:
-                        with open(archivo_reporte, 'rb') as f:
-                            st.download_button(
-                                label="📥 Descargar Reporte Completo (Excel)",
-                                data=f.read(),
-                                file_name=f'reporte_completo_{datetime.now().strftime("%Y%m%d_%H%M")}.xlsx',
-                                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                                use_container_width=True
-                            )
+                st.dataframe(df_revisar, use_container_width=True, hide_index=True, height=400)
                 
-                with tab5:
-                    st.subheader("📋 Log del Proceso")
-                    
-                    log_files = [f for f in os.listdir(temp_output) if f.endswith('.log')]
-                    if log_files:
-                        with open(os.path.join(temp_output, log_files[0]), 'r', encoding='utf-8') as f:
-                            log_content = f.read()
-                        
-                        st.text_area("Log completo:", log_content, height=400)
-                        
-                        st.download_button(
-                            label="📥 Descargar Log",
-                            data=log_content.encode('utf-8'),
-                            file_name=f'log_analisis_{datetime.now().strftime("%Y%m%d_%H%M")}.txt',
-                            mime='text/plain',
-                        )
-                    else:
-                        st.info("No se encontró archivo de log")
+                if resultado.df_reabastecimientos is not None:
+                    st.markdown("**Entradas de stock detectadas** (fecha y unidades de cada subida)")
+                    st.dataframe(resultado.df_reabastecimientos, use_container_width=True, hide_index=True, height=300)
                 
-                with tab6:
-                    st.subheader("🔧 Información de Debug")
-                    
-                    st.markdown("### 📋 Estructura del Resumen")
-                    st.dataframe(df_resumen, use_container_width=True)
-                    
-                    st.markdown("### 📊 Estados en el Reporte")
-                    if 'Estado' in df_reporte.columns:
-                        estados_unicos = df_reporte['Estado'].value_counts()
-                        st.dataframe(estados_unicos, use_container_width=True)
-                    else:
-                        st.error("La columna 'Estado' no existe en el reporte")
-                    
-                    st.markdown("### 📁 Columnas del Reporte")
-                    st.write(list(df_reporte.columns))
-                    
-                    st.markdown("### 🔢 Valores de Variables")
-                    st.json({
-                        "total_productos": int(total_productos) if isinstance(total_productos, (int, float)) else str(total_productos),
-                        "sin_existencias": int(sin_existencias) if isinstance(sin_existencias, (int, float)) else str(sin_existencias),
-                        "bajo_stock": int(bajo_stock) if isinstance(bajo_stock, (int, float)) else str(bajo_stock),
-                        "en_descenso": int(en_descenso) if isinstance(en_descenso, (int, float)) else str(en_descenso),
-                        "normales": int(normales) if isinstance(normales, (int, float)) else str(normales),
-                        "revisar": int(revisar) if isinstance(revisar, (int, float)) else str(revisar),
-                        "total_reabastecer": str(total_reabastecer)
-                    })
+                csv_revisar = df_revisar.to_csv(index=False).encode('utf-8')
+                st.download_button(
+                    label="📥 Descargar Productos a Revisar (CSV)",
+                    data=csv_revisar,
+                    file_name=f'productos_revisar_{datetime.now().strftime("%Y%m%d_%H%M")}.csv',
+                    mime='text/csv',
+                )
+            else:
+                st.success("✅ No hay productos con posible reabastecimiento")
+        
+        with tab4:
+            st.subheader("📋 Reporte Completo de Inventario")
             
-            except Exception as e:
-                st.error(f"❌ Error durante el análisis:")
-                st.exception(e)
+            col1, col2 = st.columns(2)
+            with col1:
+                filtro_estado = st.multiselect(
+                    "Filtrar por estado:",
+                    options=list(df_reporte['Estado'].unique()),
+                    default=list(df_reporte['Estado'].unique())
+                )
+            with col2:
+                buscar_producto = st.text_input("🔍 Buscar producto:", "")
+            
+            df_filtrado = df_reporte[df_reporte['Estado'].isin(filtro_estado)]
+            if buscar_producto:
+                df_filtrado = df_filtrado[
+                    df_filtrado['Producto'].str.contains(buscar_producto, case=False, na=False) |
+                    df_filtrado['Código'].str.contains(buscar_producto, case=False, na=False)
+                ]
+            
+            st.caption(f"Mostrando {len(df_filtrado)} de {len(df_reporte)} productos")
+            st.dataframe(df_filtrado, use_container_width=True, hide_index=True, height=500)
+            
+            st.divider()
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                csv = df_filtrado.to_csv(index=False).encode('utf-8')
+                st.download_button(
+                    label="📥 Descargar Reporte (CSV)",
+                    data=csv,
+                    file_name=f'reporte_inventario_{datetime.now().strftime("%Y%m%d_%H%M")}.csv',
+                    mime='text/csv',
+                    use_container_width=True
+                )
+            
+            with col2:
+                # El Excel se genera solo al pulsar el botón
+                st.download_button(
+                    label="📥 Descargar Reporte Completo (Excel)",
+                    data=resultado.excel_bytes,
+                    file_name=f'reporte_completo_{datetime.now().strftime("%Y%m%d_%H%M")}.xlsx',
+                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                    use_container_width=True
+                )
+        
+        with tab5:
+            st.subheader("📋 Log del Proceso")
+            
+            if log_content:
+                st.text_area("Log completo:", log_content, height=400)
                 
-                with st.expander("Ver detalles técnicos del error"):
-                    import traceback
-                    st.code(traceback.format_exc())
+                st.download_button(
+                    label="📥 Descargar Log",
+                    data=log_content.encode('utf-8'),
+                    file_name=f'log_analisis_{datetime.now().strftime("%Y%m%d_%H%M")}.txt',
+                    mime='text/plain',
+                )
+            else:
+                st.info("No se encontró archivo de log")
+        
+        with tab6:
+            st.subheader("🔧 Información de Debug")
             
-            finally:
-                try:
-                    shutil.rmtree(temp_dir)
-                except:
-                    pass
+            st.markdown("### 📋 Estructura del Resumen")
+            st.dataframe(df_resumen, use_container_width=True)
+            
+            st.markdown("### 📊 Estados en el Reporte")
+            if 'Estado' in df_reporte.columns:
+                estados_unicos = df_reporte['Estado'].value_counts()
+                st.dataframe(estados_unicos, use_container_width=True)
+            else:
+                st.error("La columna 'Estado' no existe en el reporte")
+            
+            st.markdown("### 📁 Columnas del Reporte")
+            st.write(list(df_reporte.columns))
+            
+            st.markdown("### ⏱️ Tiempos por Etapa")
+            # La carga se memoriza aparte: sus etapas vienen del análisis inicial
+            etapas = analisis['perfil']['etapas'] + resultado.perfil.get('etapas', [])
+            st.dataframe(pd.DataFrame(etapas), use_container_width=True, hide_index=True)
+            
+            st.markdown("### 📄 Lectura de Archivos")
+            lecturas = pd.DataFrame(analisis['perfil']['lecturas'])
+            if len(lecturas) > 0:
+                lecturas['dialecto'] = lecturas['dialecto'].astype(str)
+            st.dataframe(lecturas, use_container_width=True, hide_index=True)
+            
+            perfil = {**analisis['perfil'], 'etapas': etapas}
+            st.download_button(
+                label="📥 Descargar Perfil (JSON)",
+                data=json.dumps(perfil, ensure_ascii=False, indent=2, default=str).encode('utf-8'),
+                file_name=f'perfil_analisis_{datetime.now().strftime("%Y%m%d_%H%M")}.json',
+                mime='application/json',
+            )
+            
+            st.markdown("### 🔢 Valores de Variables")
+            st.json({
+                "total_productos": total_productos,
+                "sin_existencias": sin_existencias,
+                "bajo_stock": bajo_stock,
+                "en_descenso": en_descenso,
+                "normales": normales,
+                "revisar": revisar,
+                "total_reabastecer": total_reabastecer
+            })
 
 else:
     st.info("👆 Sube archivos CSV de inventario desde el panel lateral para comenzar")
@@ -445,7 +552,7 @@ MED002;Acetaminofén 500mg;200""", language="csv")
         | 🟠 **BAJO STOCK** | Stock ≤ Mínimo | Reabastecer pronto |
         | 🟡 **EN DESCENSO** | % < 30% | Monitorear |
         | 🟢 **NORMAL** | Stock OK | Sin acción |
-        | 🔵 **REVISAR** | Variación negativa | Verificar |
+        | 🔵 **REVISAR** | Variación negativa con stock sobre el mínimo | Verificar |
         """)
 
 st.divider()
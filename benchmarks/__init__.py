@@ -0,0 +1,13 @@
+"""
+Benchmarks del análisis de inventario
+
+- generador: crea archivos diarios de inventario sintéticos (SKUs, días,
+  codificación, delimitador, estilo decimal, reabastecimientos y duplicados)
+- escenarios: mide cada etapa del pipeline a distintos tamaños y guarda JSON
+- regresion: compara el bucle original de variacion_maxima_diaria con el
+  cálculo vectorizado y comprueba el consumo diario con días sin archivo
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.escenarios --skus 1000 10000 100000
+"""
+from benchmarks.generador import generar_inventarios
@@ -0,0 +1,191 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generador import generar_inventarios
+from script_analisis import InventoryAnalyzer, MatrizInventario, pronosticar_demanda
+
+CARPETA_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultados')
+
+
+def version_codigo():
+    """Commit actual del repositorio (None si no se puede obtener)"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def medir(funcion, repeticiones=1):
+    """
+    Ejecuta funcion() varias veces y mide el tiempo
+
+    Returns:
+        Tupla (mejor tiempo en segundos, valor devuelto por la última ejecución)
+    """
+    tiempos = []
+    valor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        valor = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), valor
+
+
+def ejecutar_escenario(num_skus, num_dias=7, repeticiones=1, output_format='excel', **opciones_generador):
+    """
+    Genera un inventario sintético y mide cada etapa del pipeline
+
+    Args:
+        num_skus: Número de productos
+        num_dias: Número de días (archivos)
+        repeticiones: Repeticiones por etapa (se guarda la mejor)
+        output_format: Formato del reporte en la etapa generar_reporte
+        **opciones_generador: Parámetros adicionales de generar_inventarios
+
+    Returns:
+        Diccionario con la configuración, los tiempos por etapa y las filas procesadas
+    """
+    carpeta = tempfile.mkdtemp(prefix='benchmark_inventario_')
+    try:
+        carpeta_datos = os.path.join(carpeta, 'inventarios')
+        carpeta_salida = os.path.join(carpeta, 'reportes')
+        fecha_inicio = datetime(2025, 10, 6)
+
+        inicio = time.perf_counter()
+        archivos = generar_inventarios(carpeta_datos, num_skus=num_skus, num_dias=num_dias,
+                                       fecha_inicio=fecha_inicio, **opciones_generador)
+        tiempo_generacion = time.perf_counter() - inicio
+
+        analyzer = InventoryAnalyzer(
+            input_folder=carpeta_datos,
+            output_folder=carpeta_salida,
+            incluir_fines_semana=True,
+            usar_cache_dialectos=False,
+            output_format=output_format
+        )
+
+        etapas = {}
+        etapas['leer_archivo'], _ = medir(
+            lambda: [analyzer.leer_archivo(archivo) for archivo in archivos], repeticiones
+        )
+        etapas['cargar_archivos_semana'], (df_consolidado, dias_faltantes) = medir(
+            lambda: analyzer.cargar_archivos_semana(semana_inicio=fecha_inicio), repeticiones
+        )
+        etapas['calcular_variaciones'], df_variaciones = medir(
+            lambda: analyzer.calcular_variaciones(df_consolidado), repeticiones
+        )
+        # Etapa opcional del pipeline: no cuenta en total_s
+        matriz = MatrizInventario.desde_consolidado(df_consolidado)
+        etapas['pronosticar_demanda'], _ = medir(lambda: pronosticar_demanda(matriz), repeticiones)
+        etapas['calcular_alertas'], df_analisis = medir(
+            lambda: analyzer.calcular_alertas(df_variaciones.copy()), repeticiones
+        )
+        etapas['generar_reporte'], _ = medir(
+            lambda: analyzer.generar_reporte(df_analisis.copy(), dias_faltantes), repeticiones
+        )
+
+        return {
+            'num_skus': num_skus,
+            'num_dias': num_dias,
+            'output_format': output_format,
+            'generador': opciones_generador,
+            'filas_consolidadas': len(df_consolidado),
+            'productos_analizados': len(df_analisis),
+            'tiempo_generacion_s': round(tiempo_generacion, 4),
+            'etapas_s': {etapa: round(segundos, 4) for etapa, segundos in etapas.items()},
+            'total_s': round(sum(etapas[e] for e in etapas if e not in ('leer_archivo', 'pronosticar_demanda')), 4)
+        }
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def guardar_resultados(escenarios, destino=None):
+    """
+    Guarda los resultados en JSON con la versión del código y del entorno
+
+    Returns:
+        Ruta del archivo JSON
+    """
+    commit = version_codigo()
+    if destino is None:
+        os.makedirs(CARPETA_RESULTADOS, exist_ok=True)
+        sufijo = f"_{commit}" if commit else ''
+        destino = os.path.join(CARPETA_RESULTADOS,
+                               f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}{sufijo}.json")
+
+    registro = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'entorno': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform()
+        },
+        'escenarios': escenarios
+    }
+    with open(destino, 'w', encoding='utf-8') as f:
+        json.dump(registro, f, ensure_ascii=False, indent=2)
+    return destino
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de análisis de inventario")
+    parser.add_argument('--skus', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Tamaños de catálogo a medir")
+    parser.add_argument('--dias', type=int, default=7, help="Días (archivos) por escenario")
+    parser.add_argument('--repeticiones', type=int, default=1, help="Repeticiones por etapa (se guarda la mejor)")
+    parser.add_argument('--formato', default='excel', help="Formato del reporte: excel, parquet, csv o jsonl")
+    parser.add_argument('--codificacion', default='latin-1')
+    parser.add_argument('--delimitador', default=';')
+    parser.add_argument('--decimal', default='entero', help="Estilo decimal: entero, punto o coma")
+    parser.add_argument('--reabastecimiento', type=float, default=0.05,
+                        help="Probabilidad diaria de reabastecimiento por producto")
+    parser.add_argument('--duplicados', type=float, default=0.0,
+                        help="Proporción de filas con código duplicado")
+    parser.add_argument('--salida', default=None, help="Ruta del JSON de resultados")
+    parser.add_argument('--con-logs', action='store_true', help="Mostrar los logs INFO del analizador")
+    args = parser.parse_args()
+
+    if not args.con_logs:
+        logging.getLogger('script_analisis').setLevel(logging.WARNING)
+
+    escenarios = []
+    for num_skus in args.skus:
+        print(f"⏱️ Escenario: {num_skus} SKUs × {args.dias} días")
+        resultado = ejecutar_escenario(
+            num_skus,
+            num_dias=args.dias,
+            repeticiones=args.repeticiones,
+            output_format=args.formato,
+            codificacion=args.codificacion,
+            delimitador=args.delimitador,
+            estilo_decimal=args.decimal,
+            frecuencia_reabastecimiento=args.reabastecimiento,
+            proporcion_duplicados=args.duplicados
+        )
+        for etapa, segundos in resultado['etapas_s'].items():
+            print(f"   {etapa:<24} {segundos:>9.3f} s")
+        escenarios.append(resultado)
+
+    destino = guardar_resultados(escenarios, args.salida)
+    print(f"📊 Resultados guardados en: {destino}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Nombres base y presentaciones (con tildes para probar las codificaciones)
+NOMBRES_BASE = [
+    'Acetaminofén', 'Ibuprofeno', 'Amoxicilina', 'Losartán', 'Metformina',
+    'Omeprazol', 'Loratadina', 'Salbutamol', 'Diclofenaco', 'Enalapril',
+    'Atorvastatina', 'Cefalexina', 'Ranitidina', 'Naproxeno', 'Clonazepam'
+]
+PRESENTACIONES = ['50mg', '100mg', '250mg', '400mg', '500mg', '1g', 'jarabe 120ml', 'crema 30g']
+
+ESTILOS_DECIMAL = ('entero', 'punto', 'coma')
+
+
+def formatear_cantidades(cantidades, estilo_decimal):
+    """
+    Convierte cantidades a texto según el estilo decimal
+
+    Args:
+        cantidades: Array de cantidades (float)
+        estilo_decimal: 'entero' (120), 'punto' (1234.50) o 'coma' (1.234,50)
+
+    Returns:
+        Lista de textos
+    """
+    if estilo_decimal == 'entero':
+        return [str(int(c)) for c in np.round(cantidades)]
+    if estilo_decimal == 'punto':
+        return [f"{c:.2f}" for c in cantidades]
+    if estilo_decimal == 'coma':
+        # Punto de miles y coma decimal
+        return [f"{c:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.') for c in cantidades]
+    raise ValueError(f"Estilo decimal no soportado: {estilo_decimal}")
+
+
+def generar_inventarios(carpeta, num_skus=1000, num_dias=7, fecha_inicio=datetime(2025, 10, 6),
+                        codificacion='latin-1', delimitador=';', estilo_decimal='entero',
+                        frecuencia_reabastecimiento=0.05, proporcion_duplicados=0.0, semilla=0):
+    """
+    Genera archivos diarios de inventario sintéticos (inventario_YYYY-MM-DD.csv)
+
+    Cada producto parte de un stock aleatorio y baja cada día según su consumo;
+    con probabilidad frecuencia_reabastecimiento recibe mercancía ese día.
+
+    Args:
+        carpeta: Carpeta donde se escriben los archivos (se crea si no existe)
+        num_skus: Número de productos distintos
+        num_dias: Número de días consecutivos desde fecha_inicio
+        fecha_inicio: Fecha del primer archivo
+        codificacion: Codificación de los archivos (ej: 'latin-1', 'utf-8', 'utf-8-sig')
+        delimitador: Separador de columnas (ej: ';', ',', '\t', '|')
+        estilo_decimal: 'entero', 'punto' o 'coma'
+        frecuencia_reabastecimiento: Probabilidad diaria de reabastecimiento por producto
+        proporcion_duplicados: Proporción de filas extra con un código ya existente
+        semilla: Semilla del generador aleatorio (resultados reproducibles)
+
+    Returns:
+        Lista de rutas de los archivos generados, en orden de fecha
+    """
+    if estilo_decimal not in ESTILOS_DECIMAL:
+        raise ValueError(f"Estilo decimal no soportado: {estilo_decimal}")
+
+    rng = np.random.default_rng(semilla)
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+
+    codigos = np.array([f"{100000 + i}" for i in range(num_skus)])
+    nombres = np.array([
+        f"{NOMBRES_BASE[i % len(NOMBRES_BASE)]} {PRESENTACIONES[(i // len(NOMBRES_BASE)) % len(PRESENTACIONES)]} #{i}"
+        for i in range(num_skus)
+    ])
+
+    # Stock inicial y consumo diario medio por producto
+    stock = rng.integers(0, 500, num_skus).astype(float)
+    consumo_medio = rng.gamma(2.0, 5.0, num_skus)
+    if estilo_decimal != 'entero':
+        stock += rng.integers(0, 100, num_skus) / 100
+
+    archivos = []
+    for dia in range(num_dias):
+        fecha = fecha_inicio + timedelta(days=dia)
+
+        if dia > 0:
+            consumo = rng.poisson(consumo_medio).astype(float)
+            reabastecidos = rng.random(num_skus) < frecuencia_reabastecimiento
+            entrada = np.where(reabastecidos, rng.integers(50, 300, num_skus), 0)
+            stock = np.maximum(stock - consumo, 0) + entrada
+
+        df_dia = pd.DataFrame({
+            'codigo': codigos,
+            'nombre': nombres,
+            'cantidad': formatear_cantidades(stock, estilo_decimal)
+        })
+
+        # Filas duplicadas (mismo código, cantidad distinta) como en exportaciones reales
+        num_duplicados = int(num_skus * proporcion_duplicados)
+        if num_duplicados > 0:
+            posiciones = rng.choice(num_skus, num_duplicados, replace=False)
+            duplicados = df_dia.iloc[posiciones].copy()
+            duplicados['cantidad'] = formatear_cantidades(
+                rng.integers(0, 500, num_duplicados).astype(float), estilo_decimal
+            )
+            df_dia = pd.concat([df_dia, duplicados], ignore_index=True)
+
+        archivo = carpeta / f"inventario_{fecha.strftime('%Y-%m-%d')}.csv"
+        df_dia.to_csv(archivo, sep=delimitador, encoding=codificacion, index=False)
+        archivos.append(str(archivo))
+
+    return archivos
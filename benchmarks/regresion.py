@@ -0,0 +1,159 @@
+"""
+Comprobaciones de regresión del cálculo de variaciones
+
+- variacion_maxima_diaria: compara el bucle por producto original con el cálculo
+  vectorizado de InventoryAnalyzer.calcular_variaciones sobre datos sintéticos con
+  las filas desordenadas y días sin registro
+- consumo_promedio_diario: con un consumo constante y días sin archivo, el consumo
+  por día debe ser el real, igual en el análisis completo y en el incremental
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.regresion --skus 500 --dias 10 --semillas 0 1 2
+"""
+import argparse
+import logging
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from script_analisis import InventoryAnalyzer
+
+
+def consolidado_sintetico(num_skus=500, num_dias=10, proporcion_faltantes=0.1, semilla=0):
+    """
+    Genera un consolidado (una fila por producto y día) con las filas desordenadas
+
+    Cada producto sube o baja una cantidad aleatoria cada día; una parte de los
+    registros se elimina para que haya días sin registro.
+
+    Returns:
+        DataFrame con codigo_producto, nombre_producto, cantidad y fecha_reporte
+    """
+    rng = np.random.default_rng(semilla)
+    fechas = pd.date_range(datetime(2025, 10, 6), periods=num_dias)
+    codigos = np.repeat([f"P{i:05d}" for i in range(num_skus)], num_dias)
+    cantidades = 500 + rng.integers(-40, 60, size=(num_skus, num_dias)).cumsum(axis=1)
+
+    df = pd.DataFrame({
+        'codigo_producto': codigos,
+        'nombre_producto': np.char.add('Producto ', codigos.astype(str)),
+        'cantidad': cantidades.ravel().astype(float),
+        'fecha_reporte': np.tile(fechas, num_skus)
+    })
+    df = df[rng.random(len(df)) >= proporcion_faltantes]
+    return df.sample(frac=1, random_state=semilla).reset_index(drop=True)
+
+
+def variacion_maxima_bucle(df_consolidado):
+    """
+    Implementación original: un filtrado del frame ordenado por cada producto
+
+    Returns:
+        Serie indexada por codigo_producto (0 si el producto tiene un solo registro)
+    """
+    df_sorted = df_consolidado.sort_values(['codigo_producto', 'fecha_reporte'])
+    codigos = df_sorted['codigo_producto'].unique()
+    resultado = pd.Series(0.0, index=pd.Index(codigos, name='codigo_producto'))
+    for producto in codigos:
+        datos_prod = df_sorted[df_sorted['codigo_producto'] == producto].copy()
+        if len(datos_prod) > 1:
+            datos_prod['var_diaria'] = datos_prod['cantidad'].diff()
+            resultado[producto] = datos_prod['var_diaria'].max()
+    return resultado
+
+
+def comprobar_variacion_maxima_diaria(num_skus=500, num_dias=10, semilla=0):
+    """
+    Compara el bucle original con calcular_variaciones en los productos analizados
+
+    Returns:
+        Número de productos comparados
+
+    Raises:
+        AssertionError: Si algún producto difiere
+    """
+    df_consolidado = consolidado_sintetico(num_skus, num_dias, semilla=semilla)
+    esperado = variacion_maxima_bucle(df_consolidado)
+
+    carpeta = tempfile.mkdtemp(prefix='regresion_inventario_')
+    try:
+        analyzer = InventoryAnalyzer(input_folder=carpeta, output_folder=carpeta, usar_cache_dialectos=False)
+        df_variaciones = analyzer.calcular_variaciones(df_consolidado)
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    obtenido = df_variaciones.set_index('codigo_producto')['variacion_maxima_diaria']
+    obtenido.index = obtenido.index.astype(str)
+    pd.testing.assert_series_equal(
+        obtenido.sort_index(), esperado.loc[obtenido.index].sort_index(),
+        check_dtype=False, check_names=False, check_index_type=False
+    )
+    return len(obtenido)
+
+
+def comprobar_consumo_con_dias_faltantes(num_skus=50, num_dias=28, consumo_diario=10.0, semilla=0):
+    """
+    Consumo constante con un día sin archivo cada semana (miércoles) y registros sueltos
+    faltantes: el consumo promedio diario debe ser consumo_diario en todos los productos,
+    tanto con calcular_variaciones como con el estado incremental día a día
+
+    Returns:
+        Número de productos comparados
+
+    Raises:
+        AssertionError: Si algún consumo difiere
+    """
+    rng = np.random.default_rng(semilla)
+    fechas = pd.date_range(datetime(2025, 10, 6), periods=num_dias)
+    codigos = np.repeat([f"P{i:05d}" for i in range(num_skus)], num_dias)
+    df = pd.DataFrame({
+        'codigo_producto': codigos,
+        'nombre_producto': np.char.add('Producto ', codigos.astype(str)),
+        'cantidad': np.tile(1000 - consumo_diario * np.arange(num_dias), num_skus),
+        'fecha_reporte': np.tile(fechas, num_skus)
+    })
+    # Días intermedios: el primero y el último de cada producto se conservan
+    intermedio = (df['fecha_reporte'] > fechas[0]) & (df['fecha_reporte'] < fechas[-1])
+    faltante = (df['fecha_reporte'].dt.dayofweek == 2) | (rng.random(len(df)) < 0.1)
+    df = df[~(intermedio & faltante)].sample(frac=1, random_state=semilla).reset_index(drop=True)
+
+    carpeta = tempfile.mkdtemp(prefix='regresion_inventario_')
+    try:
+        analyzer = InventoryAnalyzer(input_folder=carpeta, output_folder=carpeta, usar_cache_dialectos=False)
+        completo = analyzer.calcular_variaciones(df).set_index('codigo_producto')['consumo_promedio_diario']
+
+        estado = analyzer.cargar_estado_incremental()
+        for fecha, df_dia in df.groupby('fecha_reporte'):
+            estado = analyzer.actualizar_estado(estado, df_dia.drop(columns='fecha_reporte'), fecha)
+        incremental = analyzer._variaciones_desde_estado(estado).set_index('codigo_producto')['consumo_promedio_diario']
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    esperado = pd.Series(consumo_diario, index=completo.index)
+    pd.testing.assert_series_equal(completo, esperado, check_names=False)
+    incremental.index = incremental.index.astype(completo.index.dtype)
+    pd.testing.assert_series_equal(incremental.loc[completo.index], esperado, check_names=False)
+    return len(completo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regresión del cálculo de variaciones")
+    parser.add_argument('--skus', type=int, default=500, help="Número de productos")
+    parser.add_argument('--dias', type=int, default=10, help="Número de días")
+    parser.add_argument('--semillas', type=int, nargs='+', default=[0, 1, 2], help="Semillas de los datos sintéticos")
+    args = parser.parse_args()
+
+    logging.getLogger('script_analisis').setLevel(logging.WARNING)
+
+    for semilla in args.semillas:
+        comparados = comprobar_variacion_maxima_diaria(args.skus, args.dias, semilla)
+        print(f"✓ Semilla {semilla}: {comparados} productos idénticos")
+        comparados = comprobar_consumo_con_dias_faltantes(semilla=semilla)
+        print(f"✓ Semilla {semilla}: consumo diario correcto con días faltantes en {comparados} productos")
+
+
+if __name__ == '__main__':
+    main()
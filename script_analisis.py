@@ -1,13 +1,756 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import io
 import os
+import re
+import csv
 import glob
+import codecs
+import sys
+import json
+import hashlib
 import logging
+import sqlite3
+import threading
+import time
+import tracemalloc
+from logging.handlers import MemoryHandler
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
+from dataclasses import dataclass, field
+from pandas.api.types import union_categoricals
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    import resource
+except ImportError:  # Windows no tiene el módulo resource
+    resource = None
+
+# Bytes iniciales que se leen para detectar el dialecto de un CSV
+BYTES_MUESTRA_DIALECTO = 64 * 1024
+
+# Filas cuyas cantidades se revisan como texto tras leer un CSV con el dialecto en caché
+FILAS_VERIFICACION_FORMATO = 200
+
+# Patrones para inferir el separador decimal a partir de la muestra
+PATRON_NUMERO = re.compile(r'^-?\d[\d.,]*$')
+PATRON_DECIMAL_COMA = re.compile(r'(,\d{1,2}$)|(\.\d{3},)')
+PATRON_DECIMAL_PUNTO = re.compile(r'(\.\d{1,2}$)|(,\d{3}\.)|(\.\d{4,}$)')
+
+# Estados de alerta (en orden de urgencia)
+ESTADO_SIN_EXISTENCIAS = '🔴 SIN EXISTENCIAS'
+ESTADO_BAJO_STOCK = '🟠 BAJO STOCK'
+ESTADO_EN_DESCENSO = '🟡 EN DESCENSO'
+ESTADO_NORMAL = '🟢 NORMAL'
+ESTADO_REVISAR = '🔵 REVISAR (Posible Reabastecimiento)'
+ESTADOS_ALERTA = [ESTADO_SIN_EXISTENCIAS, ESTADO_BAJO_STOCK, ESTADO_EN_DESCENSO, ESTADO_NORMAL, ESTADO_REVISAR]
+
+# Fechas en nombres de archivo (YYYY-MM-DD, YYYYMMDD, DD-MM-YYYY)
+PATRON_FECHA_NOMBRE = re.compile(r'\d{4}-\d{2}-\d{2}|\d{2}-\d{2}-\d{4}|\d{8}')
+
+# Formatos de nombre de archivo reconocidos, en orden de prioridad
+PATRONES_NOMBRE_ARCHIVO = [
+    (re.compile(r'^inventario_(\d{4}-\d{2}-\d{2})\.'), '%Y-%m-%d'),
+    (re.compile(r'^inventario_(\d{8})\.'), '%Y%m%d'),
+    (re.compile(r'(\d{4}-\d{2}-\d{2})\.'), '%Y-%m-%d'),
+    (re.compile(r'(\d{2}-\d{2}-\d{4})\.'), '%d-%m-%Y')
+]
+EXTENSIONES_SOPORTADAS = ('.xlsx', '.xls', '.csv')
+
+# Columnas del consolidado que se guardan como categóricas compartidas entre días
+COLUMNAS_CATEGORICAS = ['codigo_producto', 'nombre_producto', 'fecha_reporte', 'dia_semana']
+
+# Columnas de calcular_alertas que se usan para consolidar varias sucursales
+COLUMNAS_CONSOLIDADO_RED = ['codigo_producto', 'nombre_producto', 'cantidad_final', 'consumo_promedio_diario',
+                            'stock_minimo', 'cantidad_reabastecer', 'alerta']
+
+# Pronóstico de demanda: modelos disponibles, ventana de la media móvil (días) y
+# observaciones ficticias con las que el índice de cada día de la semana se acerca a 1
+MODELOS_PRONOSTICO = ('suavizado', 'media_movil')
+VENTANA_MEDIA_MOVIL = 28
+PSEUDO_OBSERVACIONES_ESTACIONALIDAD = 2
+
+# Ancho máximo de columna en los reportes Excel
+ANCHO_MAXIMO_COLUMNA = 50
+
+# Formatos de salida del reporte y su extensión
+EXTENSIONES_FORMATO = {
+    'excel': '.xlsx',
+    'parquet': '.parquet',
+    'csv': '.csv',
+    'jsonl': '.jsonl'
+}
+
+# Mapeo de nombres de columnas a nombres estándar
+MAPEO_COLUMNAS = {
+    'codigo': 'codigo_producto',
+    'código': 'codigo_producto',
+    'cod': 'codigo_producto',
+    'codigo_prod': 'codigo_producto',
+    'nombre': 'nombre_producto',
+    'producto': 'nombre_producto',
+    'descripcion': 'nombre_producto',
+    'descripción': 'nombre_producto',
+    'cant': 'cantidad',
+    'cantidad': 'cantidad',
+    'stock': 'cantidad',
+    'existencia': 'cantidad'
+}
+
+def limpiar_cantidades(serie, decimal=','):
+    """
+    Convierte una columna de cantidades a float de forma vectorizada
+    
+    Los valores vacíos pasan a 0, los numéricos se conservan y los textos se
+    interpretan con el separador decimal indicado, quitando el de miles (por
+    defecto 1.234,56). Los textos que no se pueden convertir pasan a 0. Los textos
+    con el formato contrario (ej: 1234.5 con decimal ',') se cuentan como sospechosos:
+    indican que el archivo cambió de formato numérico.
+    
+    Args:
+        serie: Serie de cantidades tal como se leyó del archivo
+        decimal: Separador decimal del archivo (',' o '.')
+        
+    Returns:
+        Tupla (Serie float, número de valores no vacíos que se convirtieron a 0,
+        número de textos sospechosos)
+    """
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.astype(float).fillna(0), 0, 0
+    
+    # .str devuelve NaN para los elementos que no son texto
+    try:
+        texto = serie.str.strip()
+    except AttributeError:
+        # Columna object sin ningún texto (ej: enteros y flotantes mezclados)
+        numeros = pd.to_numeric(serie, errors='coerce').astype(float)
+        return numeros.fillna(0), int((numeros.isna() & serie.notna()).sum()), 0
+    es_texto = texto.notna()
+    
+    if decimal == ',':
+        normalizado = texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        formato_contrario = PATRON_DECIMAL_PUNTO
+    else:
+        normalizado = texto.str.replace(',', '', regex=False)
+        formato_contrario = PATRON_DECIMAL_COMA
+    numeros = pd.to_numeric(serie.where(~es_texto), errors='coerce')
+    convertidos = pd.to_numeric(normalizado, errors='coerce')
+    resultado = numeros.where(~es_texto, convertidos).astype(float)
+    
+    valores_invalidos = int((resultado.isna() & serie.notna()).sum())
+    sospechosos = int(texto.str.contains(formato_contrario, na=False).sum())
+    return resultado.fillna(0), valores_invalidos, sospechosos
+
+
+def lineas_muestra(muestra, encoding):
+    """
+    Líneas no vacías de una muestra de bytes de un CSV (sin la última si la muestra
+    llenó BYTES_MUESTRA_DIALECTO y puede estar cortada)
+    """
+    texto = muestra.decode(encoding, errors='ignore')
+    lineas = [linea for linea in texto.splitlines() if linea.strip()]
+    if len(lineas) > 1 and len(muestra) == BYTES_MUESTRA_DIALECTO:
+        lineas = lineas[:-1]
+    return lineas
+
+
+def votos_formato_numerico(lineas, sep):
+    """
+    Cuenta en las filas de datos las evidencias de 1.234,56 frente a 1,234.56
+    
+    Returns:
+        Tupla (votos formato europeo, votos formato internacional)
+    """
+    votos_europeo = 0
+    votos_internacional = 0
+    for linea in lineas[1:]:
+        for campo in linea.split(sep):
+            campo = campo.strip().strip('"')
+            if not PATRON_NUMERO.match(campo):
+                continue
+            if PATRON_DECIMAL_COMA.search(campo):
+                votos_europeo += 1
+            elif PATRON_DECIMAL_PUNTO.search(campo):
+                votos_internacional += 1
+    return votos_europeo, votos_internacional
+
+
+def consolidar_dias(datos_diarios):
+    """
+    Concatena los inventarios diarios con tipos compactos
+    
+    Las columnas de COLUMNAS_CATEGORICAS pasan a categóricas con las categorías de
+    todos los días unidas y ordenadas (ordenar o agrupar por los códigos equivale a
+    hacerlo por el valor original). Las cantidades enteras se guardan en el entero
+    más pequeño que las contiene; las decimales se mantienen en float64.
+    
+    Args:
+        datos_diarios: Lista de DataFrames de cada día (con fecha_reporte, dia_semana, ...)
+        
+    Returns:
+        DataFrame consolidado
+    """
+    columnas = {}
+    for columna in datos_diarios[0].columns:
+        if columna in COLUMNAS_CATEGORICAS:
+            columnas[columna] = union_categoricals(
+                [pd.Categorical(df[columna]) for df in datos_diarios], sort_categories=True
+            )
+        else:
+            columnas[columna] = pd.concat([df[columna] for df in datos_diarios], ignore_index=True)
+    
+    df_consolidado = pd.DataFrame(columnas)
+    # Solo baja de tipo si todos los valores son enteros (si no, queda igual)
+    df_consolidado['cantidad'] = pd.to_numeric(df_consolidado['cantidad'], downcast='integer')
+    return df_consolidado
+
+
+def fecha_desde_nombre(nombre):
+    """
+    Extrae la fecha de un nombre de archivo de inventario
+    
+    Args:
+        nombre: Nombre del archivo (sin carpeta)
+        
+    Returns:
+        Tupla (fecha, prioridad del patrón en PATRONES_NOMBRE_ARCHIVO) o (None, None)
+    """
+    for prioridad, (patron, formato) in enumerate(PATRONES_NOMBRE_ARCHIVO):
+        match = patron.search(nombre)
+        if not match:
+            continue
+        try:
+            return datetime.strptime(match.group(1), formato).date(), prioridad
+        except ValueError:
+            continue
+    return None, None
+
+
+def contenido_binario(contenido):
+    """
+    Convierte el contenido de un archivo en memoria a bytes
+    
+    Args:
+        contenido: bytes, bytearray, memoryview u objeto tipo archivo (ej: UploadedFile, BytesIO)
+        
+    Returns:
+        bytes con el contenido completo
+    """
+    if isinstance(contenido, (bytes, bytearray, memoryview)):
+        return bytes(contenido)
+    if hasattr(contenido, 'getvalue'):
+        return bytes(contenido.getvalue())
+    if hasattr(contenido, 'seek'):
+        contenido.seek(0)
+    return contenido.read()
+
+
+def rss_actual_mb():
+    """
+    Memoria residente actual del proceso, en MB (desde /proc/self/statm)
+    
+    Returns:
+        float o None si la plataforma no tiene /proc (ej: Windows, macOS)
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            paginas_residentes = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return paginas_residentes * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def rss_pico_proceso_mb():
+    """
+    Memoria residente máxima del proceso desde que arrancó, en MB. No es por etapa:
+    solo crece, así que una etapa pequeña tras una grande muestra el pico de la grande
+    
+    Returns:
+        float o None si la plataforma no lo permite (ej: Windows)
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux devuelve KB y macOS bytes
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(rss / divisor, 1)
+
+
+def anchos_columnas(df, ancho_maximo=ANCHO_MAXIMO_COLUMNA):
+    """
+    Calcula el ancho de cada columna para Excel a partir del DataFrame
+    
+    Cuenta el encabezado y las celdas de texto (los números no amplían la
+    columna), más 2 caracteres de margen, con un tope de ancho_maximo.
+    
+    Args:
+        df: DataFrame que se va a escribir
+        ancho_maximo: Ancho máximo permitido
+        
+    Returns:
+        Lista de anchos, uno por columna
+    """
+    anchos = []
+    for columna in df.columns:
+        largo = len(str(columna))
+        serie = df[columna]
+        if not pd.api.types.is_numeric_dtype(serie):
+            # .str devuelve NaN para los elementos que no son texto
+            try:
+                largo_textos = serie.str.len().max()
+            except AttributeError:
+                largo_textos = np.nan
+            if pd.notna(largo_textos):
+                largo = max(largo, int(largo_textos))
+        anchos.append(min(largo + 2, ancho_maximo))
+    return anchos
+
+
+def escribir_hoja_excel(libro, nombre_hoja, df):
+    """
+    Escribe un DataFrame fila a fila en un libro openpyxl de solo escritura,
+    con el encabezado en el mismo formato que pandas y anchos ya ajustados
+    
+    Args:
+        libro: Workbook(write_only=True)
+        nombre_hoja: Nombre de la hoja
+        df: DataFrame a escribir (sin índice)
+    """
+    hoja = libro.create_sheet(nombre_hoja)
+    
+    # En modo solo escritura los anchos deben fijarse antes de la primera fila
+    for numero, ancho in enumerate(anchos_columnas(df), start=1):
+        hoja.column_dimensions[get_column_letter(numero)].width = ancho
+    
+    borde = Side(style='thin')
+    encabezado = []
+    for columna in df.columns:
+        celda = WriteOnlyCell(hoja, value=str(columna))
+        celda.font = Font(bold=True)
+        celda.border = Border(left=borde, right=borde, top=borde, bottom=borde)
+        celda.alignment = Alignment(horizontal='center', vertical='top')
+        encabezado.append(celda)
+    hoja.append(encabezado)
+    
+    # Los valores nulos se escriben como celdas vacías
+    valores = df.astype(object).where(df.notna(), None)
+    for fila in valores.itertuples(index=False, name=None):
+        hoja.append(fila)
+
+
+def exportar_tablas(tablas, ruta_reporte, formato='excel'):
+    """
+    Escribe varias tablas en el formato indicado
+    
+    En Excel cada tabla va en una hoja del mismo libro. En Parquet, CSV y JSON
+    Lines la primera tabla va en ruta_reporte y cada una de las demás en un
+    archivo hermano con su sufijo (ej: '_resumen').
+    
+    Args:
+        tablas: Lista de tuplas (nombre de hoja, sufijo de archivo, DataFrame)
+        ruta_reporte: Ruta del archivo principal (con la extensión del formato)
+        formato: 'excel', 'parquet', 'csv' o 'jsonl'
+    
+    Returns:
+        Lista de rutas escritas
+    """
+    if formato not in EXTENSIONES_FORMATO:
+        raise ValueError(f"Formato de salida no soportado: {formato}")
+    
+    if formato == 'excel':
+        # Libro de solo escritura: las filas se vuelcan sin mantener las celdas en memoria
+        libro = Workbook(write_only=True)
+        for nombre_hoja, _, df in tablas:
+            escribir_hoja_excel(libro, nombre_hoja, df)
+        libro.save(ruta_reporte)
+        return [ruta_reporte]
+    
+    base, extension = os.path.splitext(ruta_reporte)
+    rutas = []
+    for posicion, (_, sufijo, df) in enumerate(tablas):
+        ruta = ruta_reporte if posicion == 0 else f"{base}{sufijo}{extension}"
+        if formato == 'parquet':
+            df.to_parquet(ruta, index=False)
+        elif formato == 'csv':
+            df.to_csv(ruta, index=False, encoding='utf-8')
+        else:
+            df.to_json(ruta, orient='records', lines=True, force_ascii=False, date_format='iso')
+        rutas.append(ruta)
+    return rutas
+
+
+@dataclass
+class ResultadoAnalisis:
+    """
+    Resultado de un análisis en memoria: tabla del reporte, resumen con tipos nativos,
+    días sin archivo, perfil de tiempos por etapa y la tabla de calcular_alertas (con
+    las columnas internas, ej: para consolidar varias sucursales). El Excel solo se
+    genera cuando se pide con a_excel / excel_bytes
+    """
+    df_export: pd.DataFrame
+    resumen: dict
+    dias_faltantes: list = field(default_factory=list)
+    archivo_reporte: str = None
+    perfil: dict = field(default_factory=dict)
+    df_analisis: pd.DataFrame = field(default=None, repr=False)
+    df_reabastecimientos: pd.DataFrame = None
+    
+    @property
+    def df_resumen(self):
+        """Hoja 'Resumen' del reporte (Métrica / Valor)"""
+        r = self.resumen
+        return pd.DataFrame({
+            'Métrica': [
+                'Fecha de Generación',
+                'Total Productos Analizados',
+                'Productos Sin Existencias',
+                'Productos con Bajo Stock',
+                'Productos En Descenso',
+                'Productos Normales',
+                'Productos a Revisar (Posible Reabastecimiento)',
+                'Total Unidades a Reabastecer',
+                'Días Analizados (Total)',
+                'Días Laborables (L-V)',
+                'Jornadas Extraordinarias (S-D)',
+                'Días Sin Archivo',
+                'Configuración: Stock Mínimo',
+                'Configuración: Factor Promedio Semanal'
+            ],
+            'Valor': [
+                r['fecha_generacion'].strftime('%Y-%m-%d %H:%M:%S'),
+                r['total_productos'],
+                r['sin_existencias'],
+                r['bajo_stock'],
+                r['en_descenso'],
+                r['normales'],
+                r['revisar'],
+                f"{r['total_reabastecer']:.0f} unidades",
+                r['dias_analizados'],
+                r['dias_laborables'],
+                r['jornadas_extraordinarias'],
+                ', '.join(r['dias_sin_archivo']) if r['dias_sin_archivo'] else 'Ninguno',
+                r['config_stock_minimo'],
+                r['config_factor_promedio']
+            ]
+        })
+    
+    def a_excel(self, destino):
+        """
+        Escribe el reporte Excel con formato
+        
+        Args:
+            destino: Ruta del archivo o buffer binario (ej: io.BytesIO)
+        """
+        exportar_tablas(self.tablas(), destino, 'excel')
+    
+    def excel_bytes(self):
+        """Contenido del reporte Excel en memoria (para descargas)"""
+        buffer = io.BytesIO()
+        self.a_excel(buffer)
+        return buffer.getvalue()
+    
+    def exportar(self, ruta_reporte, formato='excel'):
+        """
+        Escribe el reporte en el formato indicado
+        
+        En Excel las dos tablas van en hojas del mismo libro. En Parquet, CSV y
+        JSON Lines la tabla del reporte va en ruta_reporte y el resumen (Métrica /
+        Valor) en un archivo hermano con sufijo '_resumen', con las mismas columnas.
+        
+        Args:
+            ruta_reporte: Ruta del archivo principal (con la extensión del formato)
+            formato: 'excel', 'parquet', 'csv' o 'jsonl'
+            
+        Returns:
+            Lista de rutas escritas
+        """
+        tablas = self.tablas()
+        if formato == 'parquet':
+            # Parquet exige un tipo por columna: 'Valor' mezcla números y textos
+            tablas[1][2]['Valor'] = tablas[1][2]['Valor'].astype(str)
+        return exportar_tablas(tablas, ruta_reporte, formato)
+    
+    def tablas(self):
+        """Tablas del reporte en orden: lista de (nombre de hoja, sufijo de archivo, DataFrame)"""
+        tablas = [
+            ('Reporte Semanal', '', self.df_export),
+            ('Resumen', '_resumen', self.df_resumen)
+        ]
+        if self.df_reabastecimientos is not None:
+            tablas.append(('Reabastecimientos', '_reabastecimientos', self.df_reabastecimientos))
+        return tablas
+
+
+@dataclass
+class MatrizInventario:
+    """
+    Inventario en formato ancho: matriz densa productos × días de cantidades
+    (NaN = sin registro ese día), con el índice de productos y el eje de fechas.
+    Las estadísticas por producto son reducciones por filas de la matriz
+    """
+    codigos: pd.Index
+    nombres: pd.Index
+    fechas: pd.Index
+    cantidades: np.ndarray
+    
+    @classmethod
+    def desde_consolidado(cls, df_consolidado):
+        """
+        Construye la matriz desde el formato largo (una fila por producto y día)
+        
+        Args:
+            df_consolidado: DataFrame con codigo_producto, nombre_producto, cantidad y fecha_reporte
+                            (categóricas o no)
+            
+        Returns:
+            MatrizInventario con los productos ordenados por código y las fechas en orden
+        """
+        # Con el consolidado compacto los códigos categóricos ya son las posiciones
+        codigos = pd.Categorical(df_consolidado['codigo_producto'])
+        fechas = pd.Categorical(df_consolidado['fecha_reporte'])
+        nombres = pd.Categorical(df_consolidado['nombre_producto'])
+        filas, columnas = codigos.codes, fechas.codes
+        
+        cantidades = np.full((len(codigos.categories), len(fechas.categories)), np.nan)
+        cantidades[filas, columnas] = df_consolidado['cantidad'].to_numpy(dtype=float)
+        
+        # Nombre de cada producto: el de su primer día con registro
+        orden = np.lexsort((columnas, filas))
+        productos, primeras = np.unique(filas[orden], return_index=True)
+        codigos_nombre = np.full(len(codigos.categories), -1)
+        codigos_nombre[productos] = nombres.codes[orden[primeras]]
+        
+        # Descartar categorías sin ningún registro (ej: consolidado ya filtrado)
+        con_registro = ~np.isnan(cantidades).all(axis=1)
+        return cls(
+            codigos=codigos.categories[con_registro].rename('codigo_producto'),
+            nombres=nombres.categories.take(codigos_nombre[con_registro]),
+            fechas=fechas.categories.rename('fecha_reporte'),
+            cantidades=cantidades[con_registro]
+        )
+    
+    def validos(self):
+        """Máscara productos × días de los días con registro"""
+        return ~np.isnan(self.cantidades)
+    
+    def primer_dia(self):
+        """Posición (columna) del primer registro de cada producto"""
+        return self.validos().argmax(axis=1)
+    
+    def ultimo_dia(self):
+        """Posición (columna) del último registro de cada producto"""
+        return self.cantidades.shape[1] - 1 - self.validos()[:, ::-1].argmax(axis=1)
+    
+    def posiciones_operativas(self, dias_operativos=None):
+        """
+        Posición de cada columna en el calendario de días operativos del periodo: la
+        diferencia entre dos columnas es el número de días operativos transcurridos
+        
+        Args:
+            dias_operativos: Máscara de 7 booleanos (lunes primero). Si es None, son
+                             operativos los días de la semana con alguna columna
+            
+        Returns:
+            Array de enteros con una posición por columna
+        """
+        fechas = pd.DatetimeIndex(self.fechas).normalize()
+        if len(fechas) == 0:
+            return np.zeros(0, dtype=int)
+        if dias_operativos is None:
+            dias_operativos = np.isin(np.arange(7), fechas.dayofweek)
+        calendario = pd.date_range(fechas[0], fechas[-1], freq='D')
+        return np.cumsum(np.asarray(dias_operativos)[calendario.dayofweek])[calendario.get_indexer(fechas)]
+    
+    def diferencias_diarias(self):
+        """
+        Diferencia de cada registro con el registro anterior del mismo producto
+        (saltando los días sin registro); NaN donde no hay registro o no hay anterior
+        
+        Returns:
+            Matriz productos × días
+        """
+        validos = self.validos()
+        posiciones = np.arange(self.cantidades.shape[1])
+        ultimo_valido = np.maximum.accumulate(np.where(validos, posiciones, -1), axis=1)
+        
+        anterior = np.full_like(ultimo_valido, -1)
+        anterior[:, 1:] = ultimo_valido[:, :-1]
+        filas = np.arange(self.cantidades.shape[0])[:, None]
+        previo = np.where(anterior >= 0, self.cantidades[filas, np.maximum(anterior, 0)], np.nan)
+        return np.where(validos, self.cantidades - previo, np.nan)
+    
+    def eventos_reabastecimiento(self, diferencias=None):
+        """
+        Subidas de stock de un registro al siguiente del mismo producto (entradas de mercancía)
+        
+        Args:
+            diferencias: Resultado de diferencias_diarias, si ya se calculó
+            
+        Returns:
+            DataFrame con una fila por evento: codigo_producto, nombre_producto, fecha_reporte,
+            cantidad_anterior, cantidad y unidades_reabastecidas
+        """
+        if diferencias is None:
+            diferencias = self.diferencias_diarias()
+        filas, columnas = np.nonzero(diferencias > 0)
+        unidades = diferencias[filas, columnas]
+        cantidad = self.cantidades[filas, columnas]
+        return pd.DataFrame({
+            'codigo_producto': self.codigos.take(filas),
+            'nombre_producto': self.nombres.take(filas),
+            'fecha_reporte': self.fechas.take(columnas),
+            'cantidad_anterior': cantidad - unidades,
+            'cantidad': cantidad,
+            'unidades_reabastecidas': unidades
+        }).sort_values(['fecha_reporte', 'codigo_producto'], ignore_index=True)
+
+
+@dataclass
+class ConsolidadoRed:
+    """
+    Vista consolidada de varias sucursales: una fila por producto con el stock y el
+    consumo de toda la red, y la lista de transferencias sugeridas entre sucursales
+    """
+    productos: pd.DataFrame
+    transferencias: pd.DataFrame
+    
+    def tablas(self):
+        """Tablas para el reporte de la red: lista de (nombre de hoja, sufijo de archivo, DataFrame)"""
+        productos = self.productos.rename(columns={
+            'codigo_producto': 'Código',
+            'nombre_producto': 'Producto',
+            'sucursales': 'Sucursales',
+            'stock_total': 'Stock Total',
+            'consumo_diario_total': 'Consumo Diario Total',
+            'stock_minimo_total': 'Stock Mínimo Total',
+            'sucursales_sin_existencias': 'Sucursales Sin Existencias',
+            'sucursales_bajo_stock': 'Sucursales con Bajo Stock',
+            'cantidad_reabastecer_total': 'Cantidad a Reabastecer',
+            'unidades_transferibles': 'Cubierto con Transferencias',
+            'compra_sugerida': 'Compra Sugerida'
+        })
+        transferencias = self.transferencias.rename(columns={
+            'codigo_producto': 'Código',
+            'nombre_producto': 'Producto',
+            'sucursal_origen': 'Sucursal Origen',
+            'sucursal_destino': 'Sucursal Destino',
+            'cantidad': 'Cantidad'
+        })
+        return [
+            ('Productos Red', '_productos', productos),
+            ('Transferencias', '_transferencias', transferencias)
+        ]
+
+
+def pronosticar_demanda(matriz, diferencias=None, modelo='suavizado', alfa=0.3, dias_cobertura=7):
+    """
+    Pronostica la demanda de todos los productos a la vez con estacionalidad por día de
+    la semana (los bucles son sobre días o días de la semana, nunca sobre productos)
+    
+    El consumo de cada día es la bajada de stock desde el registro anterior; los días
+    con reabastecimiento, sin registro o sin stock el día anterior no se observan, ni los que
+    siguen a un día operativo sin registro (la bajada sería de varios días). El índice de cada día de la
+    semana es su consumo medio frente al del producto (con PSEUDO_OBSERVACIONES_ESTACIONALIDAD
+    observaciones en 1 para no exagerar con pocos datos); un día de la semana sin ningún
+    registro en el periodo no es operativo: tiene índice 0 y su consumo aparece en el siguiente día con registro.
+    El nivel desestacionalizado se estima con suavizado exponencial simple o media móvil.
+    
+    Args:
+        matriz: MatrizInventario
+        diferencias: Resultado de matriz.diferencias_diarias(), si ya se calculó
+        modelo: 'suavizado' o 'media_movil' (últimos VENTANA_MEDIA_MOVIL días)
+        alfa: Peso de la última observación en el suavizado exponencial
+        dias_cobertura: Días de demanda que debe cubrir el stock tras reabastecer
+    
+    Returns:
+        DataFrame indexado por codigo_producto con demanda_diaria_pronostico (media de
+        los próximos 7 días), dias_hasta_agotarse (NaN si no se prevé consumo) y
+        cantidad_reabastecer_pronostico
+    """
+    if modelo not in MODELOS_PRONOSTICO:
+        raise ValueError(f"Modelo de pronóstico no soportado: {modelo}")
+    if diferencias is None:
+        diferencias = matriz.diferencias_diarias()
+    filas = np.arange(matriz.cantidades.shape[0])
+    stock = np.maximum(matriz.cantidades[filas, matriz.ultimo_dia()], 0)
+    
+    dias_semana = pd.DatetimeIndex(matriz.fechas).dayofweek.to_numpy()
+    indicadora = (dias_semana[:, None] == np.arange(7)).astype(float)
+    operativos = indicadora.sum(axis=0) > 0
+    
+    # Días operativos transcurridos desde el registro anterior de cada producto
+    posicion = matriz.posiciones_operativas(operativos)
+    columnas = np.arange(len(dias_semana))
+    ultimo_valido = np.maximum.accumulate(np.where(matriz.validos(), columnas, -1), axis=1)
+    anterior = np.full_like(ultimo_valido, -1)
+    anterior[:, 1:] = ultimo_valido[:, :-1]
+    consecutivo = (anterior >= 0) & (posicion[None, :] - posicion[np.maximum(anterior, 0)] == 1)
+    
+    # Sin stock el día anterior la demanda no se ve (sería 0). NaN (sin registro) no
+    # cumple las condiciones y queda como no observado
+    con_stock_previo = (matriz.cantidades - diferencias) > 0
+    consumo = np.where((diferencias <= 0) & con_stock_previo & consecutivo, np.abs(diferencias), np.nan)
+    observado = ~np.isnan(consumo)
+    
+    # Índices por día de la semana: sumas y conteos con una matriz indicadora días × 7
+    suma = np.where(observado, consumo, 0) @ indicadora
+    conteo = observado.astype(float) @ indicadora
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media = suma.sum(axis=1) / conteo.sum(axis=1)
+        k = PSEUDO_OBSERVACIONES_ESTACIONALIDAD
+        indice = (suma + k * media[:, None]) / (conteo + k) / media[:, None]
+    indice = np.where(np.isfinite(indice), indice, 1.0) * operativos
+    # Normalizar: media 1 en los días de la semana con registro
+    indice *= operativos.sum() / indice.sum(axis=1, keepdims=True)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        desestacionalizado = consumo / indice[:, dias_semana]
+    
+    if modelo == 'suavizado':
+        # Un paso por día sobre todos los productos; el nivel arranca en la primera observación
+        nivel = np.full(len(filas), np.nan)
+        for columna in desestacionalizado.T:
+            suavizado = np.where(np.isnan(nivel), columna, alfa * columna + (1 - alfa) * nivel)
+            nivel = np.where(np.isnan(columna), nivel, suavizado)
+    else:
+        ventana = desestacionalizado[:, -VENTANA_MEDIA_MOVIL:]
+        observados = (~np.isnan(ventana)).sum(axis=1)
+        nivel = np.where(observados > 0, np.nansum(ventana, axis=1) / np.maximum(observados, 1), np.nan)
+    nivel = np.nan_to_num(nivel)
+    
+    # Demanda de la próxima semana, empezando el día siguiente al último del periodo
+    ciclo = (dias_semana[-1] + 1 + np.arange(7)) % 7
+    demanda = nivel[:, None] * indice[:, ciclo]
+    acumulada = np.cumsum(demanda, axis=1)
+    semanal = acumulada[:, -1]
+    
+    # Días hasta agotarse: semanas completas cubiertas + día (fraccionario) dentro de la semana
+    with np.errstate(divide='ignore', invalid='ignore'):
+        semanas = np.where(semanal > 0, np.floor(stock / semanal), np.nan)
+        resto = stock - np.nan_to_num(semanas) * semanal
+        dia = np.minimum((acumulada < resto[:, None]).sum(axis=1), 6)
+        previa = np.where(dia > 0, acumulada[filas, np.maximum(dia - 1, 0)], 0)
+        fraccion = np.clip(np.nan_to_num(np.where(resto > 0, (resto - previa) / demanda[filas, dia], 0)), 0, 1)
+    dias_hasta_agotarse = np.where(semanal > 0, 7 * semanas + dia + fraccion, np.nan)
+    
+    # Reabastecer lo que falte para cubrir dias_cobertura días de demanda pronosticada
+    semanas_cobertura, dias_resto = divmod(int(dias_cobertura), 7)
+    demanda_cobertura = semanas_cobertura * semanal + (acumulada[:, dias_resto - 1] if dias_resto else 0)
+    
+    return pd.DataFrame({
+        'demanda_diaria_pronostico': semanal / 7,
+        'dias_hasta_agotarse': dias_hasta_agotarse,
+        'cantidad_reabastecer_pronostico': np.maximum(0, np.round(demanda_cobertura - stock))
+    }, index=matriz.codigos)
+
+
 class InventoryAnalyzer:
     """
     Sistema de análisis de inventario para dispensadora de medicamentos
@@ -16,7 +759,11 @@ class InventoryAnalyzer:
     
     def __init__(self, input_folder='./inventarios', output_folder='./reportes', 
                  incluir_fines_semana=True, stock_minimo_global=100, 
-                 usar_promedio_semanal=True, factor_promedio=0.5):
+                 usar_promedio_semanal=True, factor_promedio=0.5, usar_cache_dialectos=True,
+                 workers_lectura=1, carpeta_snapshots=None, archivos=None, output_format='excel',
+                 perfilar_memoria=False, base_historico=None, nombre_logger=None,
+                 pronosticar=False, modelo_pronostico='suavizado', alfa_pronostico=0.3,
+                 dias_cobertura_pronostico=7):
         """
         Inicializa el analizador de inventario
         
@@ -27,12 +774,46 @@ class InventoryAnalyzer:
             stock_minimo_global: Stock mínimo por defecto si no se usa promedio semanal
             usar_promedio_semanal: Si True, calcula stock mínimo basado en promedio
             factor_promedio: Multiplicador del promedio semanal para stock mínimo (ej: 0.5 = media semana)
+            usar_cache_dialectos: Si True, recuerda en output_folder el dialecto de cada patrón de archivo
+            workers_lectura: Número de hilos para leer los archivos diarios en paralelo (1 = secuencial)
+            carpeta_snapshots: Carpeta del almacén de snapshots Parquet de cada día ya normalizado.
+                               Si es None se leen siempre los archivos originales
+            archivos: Diccionario {nombre de archivo: bytes u objeto tipo archivo} para analizar
+                      archivos en memoria (ej: subidos desde la app) en lugar de input_folder
+            output_format: Formato del reporte guardado: 'excel', 'parquet', 'csv' o 'jsonl'
+            perfilar_memoria: Si True, mide el pico de memoria de cada etapa con tracemalloc
+                              (más preciso pero hace el análisis más lento)
+            base_historico: Ruta de la base SQLite con el histórico de inventarios diarios ya
+                            normalizados. Los días guardados no se vuelven a leer de los archivos
+            nombre_logger: Nombre de un logger propio (ej: la sucursal en el modo por lotes).
+                           Si se indica, el log va solo al archivo de output_folder sin pasar
+                           por el logger raíz
+            pronosticar: Si True, añade al análisis completo el pronóstico de demanda por producto
+                         (días hasta agotarse y cantidad a reabastecer según el pronóstico)
+            modelo_pronostico: 'suavizado' (exponencial) o 'media_movil'
+            alfa_pronostico: Peso de la última observación en el suavizado exponencial
+            dias_cobertura_pronostico: Días de demanda pronosticada que debe cubrir el reabastecimiento
         """
         self.input_folder = input_folder
         self.output_folder = output_folder
+        self.archivos_memoria = None if archivos is None else {
+            nombre: contenido_binario(contenido) for nombre, contenido in archivos.items()
+        }
         self.min_dias_validos = 3
+        
+        if output_format not in EXTENSIONES_FORMATO:
+            raise ValueError(f"Formato de salida no soportado: {output_format}")
+        self.output_format = output_format
         self.incluir_fines_semana = incluir_fines_semana
         
+        # Pronóstico de demanda (opcional, solo en el análisis completo)
+        if modelo_pronostico not in MODELOS_PRONOSTICO:
+            raise ValueError(f"Modelo de pronóstico no soportado: {modelo_pronostico}")
+        self.pronosticar = pronosticar
+        self.modelo_pronostico = modelo_pronostico
+        self.alfa_pronostico = alfa_pronostico
+        self.dias_cobertura_pronostico = dias_cobertura_pronostico
+        
         # Configuración de stock mínimo
         self.stock_minimo_global = stock_minimo_global
         self.usar_promedio_semanal = usar_promedio_semanal
@@ -45,24 +826,156 @@ class InventoryAnalyzer:
             self.dias_laborables = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
             self.dias_buscar = 5  # Solo días laborables
         
+        # Máscara lunes..domingo de los días operativos, para el consumo por día transcurrido
+        self.dias_operativos = np.arange(7) < self.dias_buscar
+        
         # Crear carpetas si no existen
         Path(self.output_folder).mkdir(parents=True, exist_ok=True)
         
+        # Lectura concurrente de archivos diarios (1 = secuencial)
+        self.workers_lectura = max(1, int(workers_lectura or 1))
+        self._hilo_local = threading.local()
+        self._lock_cache = threading.Lock()
+        self._indice_archivos = {}
+        
+        # Almacén de snapshots Parquet (fecha + checksum del archivo original)
+        self.carpeta_snapshots = carpeta_snapshots
+        if self.carpeta_snapshots:
+            Path(self.carpeta_snapshots).mkdir(parents=True, exist_ok=True)
+        
+        # Histórico SQLite indexado por (fecha, código de producto)
+        self.base_historico = base_historico
+        if self.base_historico:
+            Path(self.base_historico).parent.mkdir(parents=True, exist_ok=True)
+            self._crear_tablas_historico()
+        
         # Configurar logging
+        self.nombre_logger = nombre_logger
         self.setup_logging()
         
+        # Caché persistente de dialectos CSV por patrón de nombre de archivo
+        self.usar_cache_dialectos = usar_cache_dialectos
+        self.archivo_cache_dialectos = os.path.join(self.output_folder, 'cache_dialectos.json')
+        self.cache_dialectos = self._cargar_cache_dialectos()
+        
+        # Eventos de reabastecimiento del último cálculo de variaciones (ver calcular_variaciones)
+        self.reabastecimientos = None
+        
+        # Estado acumulado por producto del modo incremental y sus eventos de reabastecimiento
+        self.archivo_estado_incremental = os.path.join(self.output_folder, 'estado_incremental.parquet')
+        self.archivo_eventos_incremental = os.path.join(self.output_folder, 'eventos_reabastecimiento.parquet')
+        
+        # Perfil de tiempos y memoria por etapa (ver _medir_etapa)
+        self.perfilar_memoria = perfilar_memoria
+        self.perfil = self._nuevo_perfil()
+        
     def setup_logging(self):
         """Configura el sistema de logs"""
         log_file = os.path.join(self.output_folder, f'inventario_log_{datetime.now().strftime("%Y%m%d")}.log')
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file, encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
-        self.logger = logging.getLogger(__name__)
+        formato = '%(asctime)s - %(levelname)s - %(message)s'
+        
+        if self.nombre_logger is None:
+            logging.basicConfig(
+                level=logging.INFO,
+                format=formato,
+                handlers=[
+                    logging.FileHandler(log_file, encoding='utf-8'),
+                    logging.StreamHandler()
+                ]
+            )
+            self._logger = logging.getLogger(__name__)
+            return
+        
+        # Logger aislado: varios analizadores en el mismo proceso no mezclan sus logs
+        logger = logging.getLogger(f'{__name__}.{self.nombre_logger}')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        handler = logging.FileHandler(log_file, encoding='utf-8')
+        handler.setFormatter(logging.Formatter(formato))
+        logger.addHandler(handler)
+        self._logger = logger
+    
+    def cerrar_logging(self):
+        """Cierra los archivos del logger propio (no afecta al logger raíz)"""
+        if self.nombre_logger is None:
+            return
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+            handler.close()
+    
+    @property
+    def logger(self):
+        """Logger activo (durante la lectura en paralelo cada hilo usa un logger diferido)"""
+        return getattr(self._hilo_local, 'logger', self._logger)
+    
+    def _nuevo_perfil(self):
+        """Perfil vacío: etapas medidas y lecturas de archivos"""
+        return {
+            'inicio': datetime.now().isoformat(timespec='seconds'),
+            'memoria_tracemalloc': self.perfilar_memoria,
+            'etapas': [],
+            'lecturas': []
+        }
+    
+    @contextmanager
+    def _medir_etapa(self, etapa, filas_entrada=None):
+        """
+        Mide el tiempo, las filas y la memoria de una etapa y la añade al perfil.
+        rss_delta_mb es la variación de la memoria residente entre el inicio y el fin
+        de la etapa; rss_pico_proceso_mb es el pico de todo el proceso hasta ese momento
+        
+        Args:
+            etapa: Nombre de la etapa
+            filas_entrada: Filas que recibe la etapa (si se conocen de antemano)
+            
+        Yields:
+            Diccionario de la etapa, donde se puede completar 'filas_entrada' y 'filas_salida'
+        """
+        registro = {'etapa': etapa, 'filas_entrada': filas_entrada, 'filas_salida': None}
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        rss_inicial = rss_actual_mb()
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            registro['segundos'] = round(time.perf_counter() - inicio, 4)
+            if tracemalloc.is_tracing():
+                registro['memoria_pico_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            rss_final = rss_actual_mb()
+            registro['rss_delta_mb'] = round(rss_final - rss_inicial, 1) if rss_final is not None else None
+            registro['rss_pico_proceso_mb'] = rss_pico_proceso_mb()
+            self.perfil['etapas'].append(registro)
+            self.logger.info(f"⏱️ Etapa {etapa}: {registro['segundos']:.3f} s "
+                             f"({registro['filas_entrada']} → {registro['filas_salida']} filas)")
+    
+    @contextmanager
+    def _trazar_memoria(self):
+        """Activa tracemalloc durante el bloque si perfilar_memoria está activo"""
+        iniciar = self.perfilar_memoria and not tracemalloc.is_tracing()
+        if iniciar:
+            tracemalloc.start()
+        try:
+            yield
+        finally:
+            if iniciar:
+                tracemalloc.stop()
+    
+    def guardar_perfil(self):
+        """
+        Escribe el perfil en JSON junto al log (output_folder)
+        
+        Returns:
+            Ruta del archivo JSON
+        """
+        marca = self.perfil['inicio'].replace('-', '').replace(':', '').replace('T', '_')
+        archivo_perfil = os.path.join(self.output_folder, f'perfil_analisis_{marca}.json')
+        with open(archivo_perfil, 'w', encoding='utf-8') as f:
+            json.dump(self.perfil, f, ensure_ascii=False, indent=2, default=str)
+        return archivo_perfil
         
     def cargar_archivos_semana(self, semana_inicio=None, auto_detectar=True, 
                                fecha_inicio_filtro=None, fecha_fin_filtro=None):
@@ -96,9 +1009,8 @@ class InventoryAnalyzer:
         self.logger.info("📁 DIAGNÓSTICO: Archivos encontrados en la carpeta")
         self.logger.info("="*60)
         
-        todos_archivos = []
-        for ext in ['*.xlsx', '*.xls', '*.csv']:
-            todos_archivos.extend(glob.glob(os.path.join(self.input_folder, ext)))
+        # Un solo recorrido de la carpeta: lista de archivos e índice fecha -> archivo
+        todos_archivos = self._indexar_archivos()
         
         if not todos_archivos:
             self.logger.error(f"❌ No se encontraron archivos en: {os.path.abspath(self.input_folder)}")
@@ -112,27 +1024,8 @@ class InventoryAnalyzer:
         # Si auto_detectar está activado y no hay archivos de la semana solicitada,
         # buscar la última semana disponible
         if auto_detectar:
-            # Extraer fechas de los nombres de archivo
-            fechas_disponibles = []
-            for archivo in todos_archivos:
-                nombre = os.path.basename(archivo)
-                # Buscar patrón YYYY-MM-DD
-                import re
-                match = re.search(r'(\d{4})-(\d{2})-(\d{2})', nombre)
-                if match:
-                    try:
-                        fecha = datetime.strptime(match.group(0), '%Y-%m-%d')
-                        fechas_disponibles.append(fecha)
-                    except:
-                        pass
-                # Buscar patrón YYYYMMDD
-                match = re.search(r'(\d{8})', nombre)
-                if match:
-                    try:
-                        fecha = datetime.strptime(match.group(0), '%Y%m%d')
-                        fechas_disponibles.append(fecha)
-                    except:
-                        pass
+            # Fechas extraídas de los nombres de archivo al construir el índice
+            fechas_disponibles = [datetime.combine(fecha, datetime.min.time()) for fecha in self._indice_archivos]
             
             if fechas_disponibles:
                 fecha_mas_reciente = max(fechas_disponibles)
@@ -148,30 +1041,25 @@ class InventoryAnalyzer:
         dias_faltantes = []
         dias_encontrados = []
         
+        # Localizar el archivo de cada día y leerlos (en paralelo si está configurado)
+        dias = []
         for i in range(self.dias_buscar):  # Lunes a Viernes o Lunes a Domingo
             fecha_dia = semana_inicio + timedelta(days=i)
+            dias.append((fecha_dia, self._buscar_archivo_dia(fecha_dia)))
+        historico = self._consultar_historico(dias[0][0], dias[-1][0])
+        lecturas = self._leer_archivos_paralelo([
+            (fecha, archivo) for fecha, archivo in dias
+            if archivo and self._dia_historico(historico, fecha, archivo) is None
+        ])
+        
+        for fecha_dia, archivo_encontrado in dias:
             fecha_str = fecha_dia.strftime('%Y-%m-%d')
             nombre_dia = fecha_dia.strftime('%A')
             es_fin_semana = nombre_dia in ['Saturday', 'Sunday']
             
-            # Buscar archivo con diferentes formatos posibles
-            patrones = [
-                f"inventario_{fecha_str}.*",
-                f"inventario_{fecha_dia.strftime('%Y%m%d')}.*",
-                f"*{fecha_str}.*",
-                f"*{fecha_dia.strftime('%d-%m-%Y')}.*"
-            ]
-            
-            archivo_encontrado = None
-            for patron in patrones:
-                archivos = glob.glob(os.path.join(self.input_folder, patron))
-                if archivos:
-                    archivo_encontrado = archivos[0]
-                    break
-            
-            if archivo_encontrado:
+            if archivo_encontrado or self._dia_historico(historico, fecha_dia) is not None:
                 try:
-                    df = self.leer_archivo(archivo_encontrado)
+                    df, dialecto = self._obtener_lectura(fecha_dia, archivo_encontrado, lecturas, historico)
                     df['fecha_reporte'] = fecha_dia
                     df['dia_semana'] = nombre_dia
                     df['es_fin_semana'] = es_fin_semana
@@ -181,7 +1069,7 @@ class InventoryAnalyzer:
                     emoji_dia = "📅" if not es_fin_semana else "🗓️"
                     self.logger.info(f"{emoji_dia} Archivo cargado: {nombre_dia} ({fecha_str}) - {len(df)} productos")
                 except Exception as e:
-                    self.logger.error(f"✗ Error al leer {archivo_encontrado}: {str(e)}")
+                    self.logger.error(f"✗ Error al leer {self._origen_dia(historico, fecha_dia, archivo_encontrado)}: {str(e)}")
                     if not es_fin_semana or self.incluir_fines_semana:
                         dias_faltantes.append(f"{nombre_dia} ({fecha_str})")
             else:
@@ -209,8 +1097,8 @@ class InventoryAnalyzer:
         if dias_encontrados:
             self.logger.info(f"✓ Días procesados exitosamente: {', '.join(dias_encontrados)}")
         
-        # Consolidar datos
-        df_consolidado = pd.concat(datos_semanales, ignore_index=True)
+        # Consolidar datos (tipos compactos: categóricos y enteros pequeños)
+        df_consolidado = consolidar_dias(datos_semanales)
         
         # Contar días normales vs extraordinarios
         dias_normales = len([d for d in datos_semanales if not d['es_fin_semana'].iloc[0]])
@@ -243,11 +1131,10 @@ class InventoryAnalyzer:
         
         # Listar TODOS los archivos disponibles
         self.logger.info("📁 Archivos disponibles en la carpeta:")
-        todos_archivos = []
-        for ext in ['*.xlsx', '*.xls', '*.csv']:
-            todos_archivos.extend(glob.glob(os.path.join(self.input_folder, ext)))
+        todos_archivos = self._indexar_archivos()
         
-        if not todos_archivos:
+        # Con histórico el rango puede cubrirse aunque los archivos originales ya no estén
+        if not todos_archivos and not self.base_historico:
             self.logger.error(f"❌ No se encontraron archivos en: {os.path.abspath(self.input_folder)}")
             raise FileNotFoundError(f"No hay archivos de inventario en {self.input_folder}")
         
@@ -259,8 +1146,20 @@ class InventoryAnalyzer:
         dias_faltantes = []
         dias_encontrados = []
         
+        # Localizar el archivo de cada día del rango y leerlos (en paralelo si está configurado)
+        dias = []
         fecha_actual = fecha_inicio
         while fecha_actual <= fecha_fin:
+            omitir = not self.incluir_fines_semana and fecha_actual.strftime('%A') in ['Saturday', 'Sunday']
+            dias.append((fecha_actual, None if omitir else self._buscar_archivo_dia(fecha_actual)))
+            fecha_actual += timedelta(days=1)
+        historico = self._consultar_historico(fecha_inicio, fecha_fin)
+        lecturas = self._leer_archivos_paralelo([
+            (fecha, archivo) for fecha, archivo in dias
+            if archivo and self._dia_historico(historico, fecha, archivo) is None
+        ])
+        
+        for fecha_actual, archivo_encontrado in dias:
             fecha_str = fecha_actual.strftime('%Y-%m-%d')
             nombre_dia = fecha_actual.strftime('%A')
             es_fin_semana = nombre_dia in ['Saturday', 'Sunday']
@@ -268,27 +1167,11 @@ class InventoryAnalyzer:
             # Si no incluye fines de semana y es fin de semana, saltar
             if not self.incluir_fines_semana and es_fin_semana:
                 self.logger.info(f"⊝ Fin de semana omitido: {nombre_dia} ({fecha_str})")
-                fecha_actual += timedelta(days=1)
                 continue
             
-            # Buscar archivo
-            patrones = [
-                f"inventario_{fecha_str}.*",
-                f"inventario_{fecha_actual.strftime('%Y%m%d')}.*",
-                f"*{fecha_str}.*",
-                f"*{fecha_actual.strftime('%d-%m-%Y')}.*"
-            ]
-            
-            archivo_encontrado = None
-            for patron in patrones:
-                archivos = glob.glob(os.path.join(self.input_folder, patron))
-                if archivos:
-                    archivo_encontrado = archivos[0]
-                    break
-            
-            if archivo_encontrado:
+            if archivo_encontrado or self._dia_historico(historico, fecha_actual) is not None:
                 try:
-                    df = self.leer_archivo(archivo_encontrado)
+                    df, dialecto = self._obtener_lectura(fecha_actual, archivo_encontrado, lecturas, historico)
                     df['fecha_reporte'] = fecha_actual
                     df['dia_semana'] = nombre_dia
                     df['es_fin_semana'] = es_fin_semana
@@ -298,13 +1181,11 @@ class InventoryAnalyzer:
                     emoji_dia = "📅" if not es_fin_semana else "🗓️"
                     self.logger.info(f"{emoji_dia} Archivo cargado: {nombre_dia} ({fecha_str}) - {len(df)} productos")
                 except Exception as e:
-                    self.logger.error(f"✗ Error al leer {archivo_encontrado}: {str(e)}")
+                    self.logger.error(f"✗ Error al leer {self._origen_dia(historico, fecha_actual, archivo_encontrado)}: {str(e)}")
                     dias_faltantes.append(f"{nombre_dia} ({fecha_str})")
             else:
                 dias_faltantes.append(f"{nombre_dia} ({fecha_str})")
                 self.logger.warning(f"✗ No se encontró archivo para {nombre_dia} ({fecha_str})")
-            
-            fecha_actual += timedelta(days=1)
         
         # Validar días mínimos
         if len(datos_semanales) < self.min_dias_validos:
@@ -323,8 +1204,8 @@ class InventoryAnalyzer:
             if len(dias_encontrados) > 5:
                 self.logger.info(f"   ... y {len(dias_encontrados) - 5} más")
         
-        # Consolidar datos
-        df_consolidado = pd.concat(datos_semanales, ignore_index=True)
+        # Consolidar datos (tipos compactos: categóricos y enteros pequeños)
+        df_consolidado = consolidar_dias(datos_semanales)
         
         # Contar días normales vs extraordinarios
         dias_normales = len([d for d in datos_semanales if not d['es_fin_semana'].iloc[0]])
@@ -337,140 +1218,488 @@ class InventoryAnalyzer:
         
         return df_consolidado, dias_faltantes
     
-    def leer_archivo(self, archivo):
+    def _indexar_archivos(self):
         """
-        Lee un archivo de inventario (Excel o CSV) con manejo robusto de codificaciones y delimitadores
+        Recorre input_folder (o los archivos en memoria) una sola vez y construye el índice fecha -> archivo
+        
+        Cada nombre se interpreta con PATRONES_NOMBRE_ARCHIVO; si dos archivos caen en la
+        misma fecha gana el patrón de mayor prioridad (el primero de la lista).
+        
+        Returns:
+            Lista ordenada con todos los archivos de inventario soportados
+        """
+        archivos = []
+        if self.archivos_memoria is not None:
+            archivos = sorted(
+                nombre for nombre in self.archivos_memoria
+                if os.path.splitext(nombre)[1].lower() in EXTENSIONES_SOPORTADAS
+            )
+        elif os.path.isdir(self.input_folder):
+            with os.scandir(self.input_folder) as entradas:
+                archivos = sorted(
+                    entrada.path for entrada in entradas
+                    if entrada.is_file() and os.path.splitext(entrada.name)[1].lower() in EXTENSIONES_SOPORTADAS
+                )
+        
+        indice = {}
+        prioridades = {}
+        for archivo in archivos:
+            fecha, prioridad = fecha_desde_nombre(os.path.basename(archivo))
+            if fecha is not None and (fecha not in indice or prioridad < prioridades[fecha]):
+                indice[fecha] = archivo
+                prioridades[fecha] = prioridad
+        
+        self._indice_archivos = indice
+        return archivos
+    
+    def _fuente_archivo(self, archivo):
+        """Ruta del archivo, o un BytesIO nuevo si el archivo está en memoria (para pandas)"""
+        if self.archivos_memoria is not None:
+            return io.BytesIO(self.archivos_memoria[archivo])
+        return archivo
+    
+    def _abrir_archivo(self, archivo):
+        """Abre un archivo en modo binario, ya sea de disco o en memoria"""
+        if self.archivos_memoria is not None:
+            return io.BytesIO(self.archivos_memoria[archivo])
+        return open(archivo, 'rb')
+    
+    def _buscar_archivo_dia(self, fecha):
+        """
+        Busca en el índice de archivos el inventario de un día
         
         Args:
-            archivo: Ruta del archivo
+            fecha: Fecha del día buscado
             
         Returns:
-            DataFrame con columnas estandarizadas
+            Ruta del archivo encontrado o None
         """
-        extension = os.path.splitext(archivo)[1].lower()
+        if isinstance(fecha, datetime):
+            fecha = fecha.date()
+        return self._indice_archivos.get(fecha)
+    
+    def _leer_archivos_paralelo(self, dias):
+        """
+        Lee varios archivos de forma concurrente si workers_lectura > 1
         
-        if extension in ['.xlsx', '.xls']:
-            df = pd.read_excel(archivo)
-        elif extension == '.csv':
-            # Intentar múltiples codificaciones y delimitadores comunes
-            codificaciones = ['utf-8-sig', 'latin-1', 'iso-8859-1', 'cp1252', 'windows-1252']
-            delimitadores = [',', ';', '|', '\t']  # coma, punto y coma, pipe, tabulador
-            df = None
-            encoding_exitoso = None
-            delimitador_exitoso = None
-            
-            # Intentar todas las combinaciones de codificación y delimitador
-            for encoding in codificaciones:
-                if df is not None:
-                    break
-                for delim in delimitadores:
-                    try:
-                        # IMPORTANTE: decimal=',' para manejar números europeos
-                        # Si tus números usan punto como separador de miles: 1.234,56
-                        df_temp = pd.read_csv(
-                            archivo, 
-                            encoding=encoding, 
-                            sep=delim,
-                            decimal=',',  # Coma como separador decimal
-                            thousands='.'  # Punto como separador de miles
-                        )
-                        # Verificar que se hayan leído múltiples columnas
-                        if len(df_temp.columns) > 1:
-                            df = df_temp
-                            encoding_exitoso = encoding
-                            delimitador_exitoso = delim
-                            self.logger.debug(f"✓ Archivo leído: encoding={encoding}, delimitador='{delim}'")
-                            break
-                    except (UnicodeDecodeError, UnicodeError):
-                        continue
-                    except Exception as e:
-                        continue
-            
-            # Si no funcionó, intentar con decimal='.' (formato internacional)
-            if df is None:
-                for encoding in codificaciones:
-                    if df is not None:
-                        break
-                    for delim in delimitadores:
-                        try:
-                            df_temp = pd.read_csv(
-                                archivo, 
-                                encoding=encoding, 
-                                sep=delim,
-                                decimal='.',  # Punto como separador decimal
-                                thousands=','  # Coma como separador de miles
-                            )
-                            if len(df_temp.columns) > 1:
-                                df = df_temp
-                                encoding_exitoso = encoding
-                                delimitador_exitoso = delim
-                                self.logger.debug(f"✓ Archivo leído: encoding={encoding}, delimitador='{delim}' (formato internacional)")
-                                break
-                        except:
-                            continue
-            
-            if df is None:
-                # Último intento: usar el sniffer de Python para detectar delimitador
-                try:
-                    import csv
-                    with open(archivo, 'r', encoding='latin-1', errors='ignore') as f:
-                        muestra = f.read(4096)
-                        sniffer = csv.Sniffer()
-                        delim_detectado = sniffer.sniff(muestra).delimiter
-                    
-                    for encoding in codificaciones:
-                        try:
-                            df = pd.read_csv(archivo, encoding=encoding, sep=delim_detectado, decimal=',', thousands='.')
-                            if len(df.columns) > 1:
-                                encoding_exitoso = encoding
-                                delimitador_exitoso = delim_detectado
-                                self.logger.warning(f"Delimitador auto-detectado: '{delim_detectado}'")
-                                break
-                        except:
-                            continue
-                except Exception as e:
-                    self.logger.debug(f"No se pudo auto-detectar delimitador: {str(e)}")
-            
-            if df is None:
-                raise ValueError(f"No se pudo leer el archivo. Verifique el formato, codificación y delimitador.")
-            
-            # Validar que se leyeron datos
-            if df.empty or len(df.columns) == 1:
-                raise ValueError(f"El archivo parece tener un formato incorrecto. Solo se detectó 1 columna. Delimitador incorrecto?")
-                
-        else:
-            raise ValueError(f"Formato no soportado: {extension}")
+        El log de cada lectura se guarda en memoria y se emite después, en orden de fecha,
+        desde _obtener_lectura.
         
-        # Estandarizar nombres de columnas
-        df.columns = df.columns.str.lower().str.strip()
+        Args:
+            dias: Lista de tuplas (fecha, archivo) a leer
+            
+        Returns:
+            Diccionario {archivo: (df, dialecto, error, registros_log)} o None en modo secuencial
+        """
+        if self.workers_lectura <= 1 or len(dias) <= 1:
+            return None
+        
+        with ThreadPoolExecutor(max_workers=self.workers_lectura) as executor:
+            resultados = executor.map(lambda dia: self._leer_archivo_diferido(*dia), dias)
+            return {archivo: resultado for (_, archivo), resultado in zip(dias, resultados)}
+    
+    def _leer_archivo_diferido(self, fecha, archivo):
+        """Ejecuta _leer_archivo_dia en un hilo, capturando excepciones y mensajes de log"""
+        buffer_log = MemoryHandler(capacity=sys.maxsize, flushLevel=logging.CRITICAL + 1)
+        logger_hilo = logging.Logger(self._logger.name, level=self._logger.getEffectiveLevel())
+        logger_hilo.addHandler(buffer_log)
+        self._hilo_local.logger = logger_hilo
+        try:
+            df, dialecto = self._leer_archivo_dia(fecha, archivo)
+            return df, dialecto, None, buffer_log.buffer
+        except Exception as e:
+            return None, None, e, buffer_log.buffer
+        finally:
+            del self._hilo_local.logger
+    
+    def _obtener_lectura(self, fecha, archivo, lecturas, historico=None):
+        """
+        Devuelve (df, dialecto) de un día: desde el histórico si está guardado y al día,
+        o del archivo, ya leído en paralelo o leyéndolo ahora
+        
+        Args:
+            fecha: Fecha del inventario
+            archivo: Ruta del archivo (None si el día solo está en el histórico)
+            lecturas: Resultado de _leer_archivos_paralelo (None en modo secuencial)
+            historico: Resultado de _consultar_historico (None si no hay histórico)
+        """
+        df = self._dia_historico(historico, fecha, archivo)
+        if df is not None:
+            dialecto = {'formato': 'historico'}
+            self.perfil['lecturas'].append({
+                'archivo': os.path.basename(archivo) if archivo else None,
+                'fecha': fecha.strftime('%Y-%m-%d'),
+                'segundos': None,
+                'filas': len(df),
+                'dialecto': dialecto
+            })
+            return df, dialecto
+        
+        if historico and self._dia_historico(historico, fecha) is not None:
+            self.logger.info(f"♻️ {os.path.basename(archivo)} cambió desde que se guardó en el histórico, se vuelve a leer")
+        
+        if lecturas is None:
+            df, dialecto = self._leer_archivo_dia(fecha, archivo)
+        else:
+            df, dialecto, error, registros = lecturas[archivo]
+            for registro in registros:
+                self._logger.handle(registro)
+            if error is not None:
+                raise error
+        
+        if historico is not None:
+            self._guardar_historico_dia(fecha, archivo, df)
+        return df, dialecto
+    
+    def _leer_archivo_dia(self, fecha, archivo):
+        """
+        Lee el inventario de un día y registra en el perfil el tiempo, las filas y el dialecto
+        
+        Args:
+            fecha: Fecha del inventario
+            archivo: Ruta del archivo original
+            
+        Returns:
+            Tupla (DataFrame normalizado, dialecto)
+        """
+        inicio = time.perf_counter()
+        df, dialecto = self._cargar_archivo_dia(fecha, archivo)
+        # list.append es atómico: seguro también desde los hilos de lectura
+        self.perfil['lecturas'].append({
+            'archivo': os.path.basename(archivo),
+            'fecha': fecha.strftime('%Y-%m-%d'),
+            'segundos': round(time.perf_counter() - inicio, 4),
+            'filas': len(df),
+            'dialecto': dict(dialecto) if dialecto else dialecto
+        })
+        return df, dialecto
+    
+    def _cargar_archivo_dia(self, fecha, archivo):
+        """
+        Lee el inventario de un día desde su snapshot si existe y está al día,
+        o desde el archivo original (creando el snapshot si el almacén está activo)
+        
+        Args:
+            fecha: Fecha del inventario
+            archivo: Ruta del archivo original
+            
+        Returns:
+            Tupla (DataFrame normalizado, dialecto)
+        """
+        if not self.carpeta_snapshots:
+            return self.leer_archivo(archivo)
         
-        # Mapear columnas a nombres estándar
-        mapeo_columnas = {
-            'codigo': 'codigo_producto',
-            'código': 'codigo_producto',
-            'cod': 'codigo_producto',
-            'codigo_prod': 'codigo_producto',
-            'nombre': 'nombre_producto',
-            'producto': 'nombre_producto',
-            'descripcion': 'nombre_producto',
-            'descripción': 'nombre_producto',
-            'cant': 'cantidad',
-            'cantidad': 'cantidad',
-            'stock': 'cantidad',
-            'existencia': 'cantidad'
+        ruta_snapshot = self._ruta_snapshot(fecha, archivo)
+        if os.path.exists(ruta_snapshot):
+            try:
+                df = pd.read_parquet(ruta_snapshot)
+                self.logger.debug(f"✓ Snapshot reutilizado: {os.path.basename(ruta_snapshot)}")
+                return df, {'formato': 'snapshot', 'snapshot': ruta_snapshot}
+            except Exception as e:
+                self.logger.warning(f"Snapshot ilegible {os.path.basename(ruta_snapshot)} ({str(e)}), se reingiere el archivo")
+        
+        df, dialecto = self.leer_archivo(archivo)
+        self._guardar_snapshot(fecha, ruta_snapshot, df)
+        return df, dialecto
+    
+    def _ruta_snapshot(self, fecha, archivo):
+        """Ruta del snapshot de un día: fecha + checksum del archivo original"""
+        sha1 = hashlib.sha1()
+        with self._abrir_archivo(archivo) as f:
+            for bloque in iter(lambda: f.read(1024 * 1024), b''):
+                sha1.update(bloque)
+        return os.path.join(self.carpeta_snapshots, f"{fecha.strftime('%Y-%m-%d')}_{sha1.hexdigest()[:16]}.parquet")
+    
+    def _guardar_snapshot(self, fecha, ruta_snapshot, df):
+        """Escribe el snapshot de un día y elimina los de versiones anteriores del archivo"""
+        prefijo = f"{fecha.strftime('%Y-%m-%d')}_"
+        try:
+            df.to_parquet(ruta_snapshot, index=False)
+        except ImportError as e:
+            self.logger.warning(f"No se pueden crear snapshots Parquet ({str(e)}). Almacén desactivado")
+            self.carpeta_snapshots = None
+            return
+        except Exception as e:
+            self.logger.warning(f"No se pudo guardar el snapshot {os.path.basename(ruta_snapshot)}: {str(e)}")
+            return
+        
+        for nombre in os.listdir(self.carpeta_snapshots):
+            ruta = os.path.join(self.carpeta_snapshots, nombre)
+            if nombre.startswith(prefijo) and ruta != ruta_snapshot:
+                os.remove(ruta)
+                self.logger.info(f"♻️ Snapshot desactualizado eliminado: {nombre}")
+        self.logger.info(f"💾 Snapshot creado: {os.path.basename(ruta_snapshot)}")
+    
+    def ingerir_snapshots(self):
+        """
+        Convierte a snapshot todos los archivos diarios de input_folder que sean nuevos
+        o hayan cambiado desde la última ingesta
+        
+        Returns:
+            Número de días disponibles en el almacén
+        """
+        if not self.carpeta_snapshots:
+            raise ValueError("El almacén de snapshots no está configurado (carpeta_snapshots)")
+        
+        self._indexar_archivos()
+        ingeridos = 0
+        for fecha, archivo in sorted(self._indice_archivos.items()):
+            try:
+                self._leer_archivo_dia(fecha, archivo)
+                ingeridos += 1
+            except Exception as e:
+                self.logger.error(f"✗ Error al ingerir {archivo}: {str(e)}")
+        
+        self.logger.info(f"✓ Snapshots disponibles: {ingeridos} de {len(self._indice_archivos)} días")
+        return ingeridos
+    
+    def _conectar_historico(self):
+        """Conexión nueva a la base del histórico (una por uso: sqlite3 no comparte conexiones entre hilos)"""
+        return sqlite3.connect(self.base_historico)
+    
+    def _crear_tablas_historico(self):
+        """Crea las tablas del histórico si no existen"""
+        conexion = self._conectar_historico()
+        try:
+            with conexion:
+                # Clave primaria (fecha, código): las consultas por rango de fechas usan el índice
+                conexion.execute("""
+                    CREATE TABLE IF NOT EXISTS inventario_diario (
+                        fecha TEXT NOT NULL,
+                        codigo_producto TEXT NOT NULL,
+                        nombre_producto TEXT,
+                        cantidad REAL,
+                        PRIMARY KEY (fecha, codigo_producto)
+                    ) WITHOUT ROWID
+                """)
+                conexion.execute("""
+                    CREATE TABLE IF NOT EXISTS dias_ingeridos (
+                        fecha TEXT PRIMARY KEY,
+                        archivo TEXT,
+                        firma TEXT,
+                        filas INTEGER,
+                        ingerido TEXT
+                    )
+                """)
+        finally:
+            conexion.close()
+    
+    def _firma_archivo(self, archivo):
+        """
+        Firma para saber si un archivo cambió desde su ingesta: tamaño y fecha de
+        modificación en disco (sin leerlo), o SHA-1 del contenido si está en memoria
+        """
+        if self.archivos_memoria is not None:
+            return hashlib.sha1(self.archivos_memoria[archivo]).hexdigest()
+        estado = os.stat(archivo)
+        return f"{estado.st_size}-{estado.st_mtime_ns}"
+    
+    def _consultar_historico(self, fecha_inicio, fecha_fin):
+        """
+        Carga del histórico todos los días guardados en un rango, con una sola consulta
+        
+        Args:
+            fecha_inicio: Primera fecha del rango
+            fecha_fin: Última fecha del rango
+            
+        Returns:
+            Diccionario {'YYYY-MM-DD': (firma, DataFrame normalizado)}, o None si no hay histórico
+        """
+        if not self.base_historico:
+            return None
+        
+        rango = (fecha_inicio.strftime('%Y-%m-%d'), fecha_fin.strftime('%Y-%m-%d'))
+        conexion = self._conectar_historico()
+        try:
+            firmas = dict(conexion.execute(
+                "SELECT fecha, firma FROM dias_ingeridos WHERE fecha BETWEEN ? AND ?", rango
+            ).fetchall())
+            if not firmas:
+                return {}
+            df = pd.read_sql_query(
+                "SELECT fecha, codigo_producto, nombre_producto, cantidad FROM inventario_diario "
+                "WHERE fecha BETWEEN ? AND ?",
+                conexion, params=rango
+            )
+        finally:
+            conexion.close()
+        
+        historico = {
+            fecha: (firmas[fecha], df_dia.drop(columns='fecha').reset_index(drop=True))
+            for fecha, df_dia in df.groupby('fecha', sort=False)
         }
+        self.logger.info(f"🗄️ Histórico: {len(historico)} días guardados entre {rango[0]} y {rango[1]}")
+        return historico
+    
+    def _origen_dia(self, historico, fecha, archivo):
+        """
+        Describe para los logs de dónde se leyó un día: el histórico o el archivo, con la fecha
         
-        for col_original, col_nueva in mapeo_columnas.items():
-            if col_original in df.columns:
-                df.rename(columns={col_original: col_nueva}, inplace=True)
+        Args:
+            historico: Resultado de _consultar_historico
+            fecha: Fecha del día
+            archivo: Archivo del día (None si solo está en el histórico)
+        """
+        fecha_str = fecha.strftime('%Y-%m-%d')
+        try:
+            desde_historico = self._dia_historico(historico, fecha, archivo) is not None
+        except OSError:
+            # El archivo desapareció después de localizarlo
+            desde_historico = False
+        if desde_historico:
+            return f"histórico ({fecha_str})"
+        return f"{archivo} ({fecha_str})"
+    
+    def _dia_historico(self, historico, fecha, archivo=None):
+        """
+        DataFrame de un día guardado en el histórico
         
-        # Validar columnas requeridas
-        columnas_requeridas = ['codigo_producto', 'nombre_producto', 'cantidad']
-        columnas_faltantes = [col for col in columnas_requeridas if col not in df.columns]
+        Args:
+            historico: Resultado de _consultar_historico
+            fecha: Fecha del día
+            archivo: Archivo actual del día; si se indica y cambió desde la ingesta, no se usa el histórico
+            
+        Returns:
+            DataFrame o None si el día no está guardado (o está desactualizado)
+        """
+        if not historico:
+            return None
+        entrada = historico.get(fecha.strftime('%Y-%m-%d'))
+        if entrada is None:
+            return None
+        firma, df = entrada
+        if archivo is not None and firma != self._firma_archivo(archivo):
+            return None
+        return df
+    
+    def _guardar_historico_dia(self, fecha, archivo, df):
+        """Guarda (o reemplaza) un día normalizado en el histórico"""
+        fecha_str = fecha.strftime('%Y-%m-%d')
+        filas = zip(
+            [fecha_str] * len(df),
+            df['codigo_producto'].astype(str),
+            df['nombre_producto'].astype(str),
+            df['cantidad'].astype(float)
+        )
+        conexion = self._conectar_historico()
+        try:
+            with conexion:
+                conexion.execute("DELETE FROM inventario_diario WHERE fecha = ?", (fecha_str,))
+                conexion.executemany("INSERT OR REPLACE INTO inventario_diario VALUES (?, ?, ?, ?)", filas)
+                conexion.execute(
+                    "INSERT OR REPLACE INTO dias_ingeridos VALUES (?, ?, ?, ?, ?)",
+                    (fecha_str, os.path.basename(archivo), self._firma_archivo(archivo), len(df),
+                     datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+        except sqlite3.Error as e:
+            self.logger.warning(f"No se pudo guardar {fecha_str} en el histórico: {str(e)}")
+            return
+        finally:
+            conexion.close()
+        self.logger.info(f"🗄️ Día guardado en el histórico: {fecha_str} ({len(df)} productos)")
+    
+    def ingerir_historico(self):
+        """
+        Guarda en el histórico todos los archivos diarios de input_folder que sean nuevos
+        o hayan cambiado desde la última ingesta
         
-        if columnas_faltantes:
-            self.logger.error(f"Columnas disponibles en el archivo: {list(df.columns)}")
-            raise ValueError(f"Columnas requeridas no encontradas: {columnas_faltantes}")
+        Returns:
+            Número de días nuevos o actualizados
+        """
+        if not self.base_historico:
+            raise ValueError("El histórico no está configurado (base_historico)")
+        
+        self._indexar_archivos()
+        conexion = self._conectar_historico()
+        try:
+            firmas = dict(conexion.execute("SELECT fecha, firma FROM dias_ingeridos").fetchall())
+        finally:
+            conexion.close()
+        
+        ingeridos = 0
+        for fecha, archivo in sorted(self._indice_archivos.items()):
+            if firmas.get(fecha.strftime('%Y-%m-%d')) == self._firma_archivo(archivo):
+                continue
+            try:
+                df, _ = self._leer_archivo_dia(fecha, archivo)
+                self._guardar_historico_dia(fecha, archivo, df)
+                ingeridos += 1
+            except Exception as e:
+                self.logger.error(f"✗ Error al ingerir {archivo}: {str(e)}")
+        
+        self.logger.info(f"✓ Histórico actualizado: {ingeridos} días nuevos o modificados")
+        return ingeridos
+    
+    def leer_archivo(self, archivo):
+        """
+        Lee un archivo de inventario (Excel o CSV) con manejo robusto de codificaciones y delimitadores
+        
+        Args:
+            archivo: Ruta del archivo
+            
+        Returns:
+            Tupla (DataFrame con columnas estandarizadas, diccionario con el dialecto detectado)
+        """
+        extension = os.path.splitext(archivo)[1].lower()
+        decimal = ','
+        
+        if extension in ['.xlsx', '.xls']:
+            df = pd.read_excel(self._fuente_archivo(archivo))
+            dialecto = {'formato': 'excel'}
+            df, _ = self._estandarizar_columnas(df)
+        elif extension == '.csv':
+            clave_cache = self._clave_cache_dialecto(archivo)
+            entrada_cache = self.cache_dialectos.get(clave_cache) if self.usar_cache_dialectos else None
+            df = None
+            
+            # La entrada se descarta si el encabezado no coincide con el guardado
+            if entrada_cache:
+                motivo = self._motivo_cache_invalida(archivo, entrada_cache)
+                if motivo:
+                    self.logger.warning(f"♻️ Dialecto en caché inválido para '{clave_cache}' ({motivo}), se detectará de nuevo")
+                    self._invalidar_cache_dialecto(clave_cache)
+                    entrada_cache = None
+            
+            # Reutilizar el dialecto y el mapeo de columnas guardados para este patrón de archivo.
+            # Tras la lectura se comprueba el formato numérico de las primeras cantidades
+            if entrada_cache:
+                try:
+                    dialecto = dict(entrada_cache['dialecto'])
+                    df = self._leer_csv_con_dialecto(archivo, dialecto)
+                    df, _ = self._estandarizar_columnas(df, entrada_cache['columnas'], registrar_error=False)
+                    sospechosos = self._cantidades_sospechosas(archivo, dialecto, entrada_cache['columnas'])
+                    dialecto['desde_cache'] = True
+                    self.logger.debug(f"✓ Dialecto desde caché para {os.path.basename(archivo)} ({clave_cache})")
+                except Exception as e:
+                    self.logger.warning(f"♻️ Dialecto en caché inválido para '{clave_cache}' ({str(e)}), se detectará de nuevo")
+                    self._invalidar_cache_dialecto(clave_cache)
+                    df = None
+                
+                if df is not None and sospechosos > 0:
+                    self.logger.warning(f"♻️ Dialecto en caché inválido para '{clave_cache}' ({sospechosos} cantidades "
+                                        f"con otro formato numérico), se detectará de nuevo")
+                    self._invalidar_cache_dialecto(clave_cache)
+                    df = None
+            
+            if df is None:
+                # Detectar el dialecto con una sola muestra y hacer una única lectura completa
+                dialecto = self.detectar_dialecto(archivo)
+                self.logger.info(
+                    f"🔎 Dialecto detectado en {os.path.basename(archivo)}: "
+                    f"encoding={dialecto['encoding']}, delimitador={dialecto['sep']!r}, "
+                    f"decimal={dialecto['decimal']!r}, miles={dialecto['thousands']!r}"
+                )
+                df = self._leer_csv_con_dialecto(archivo, dialecto)
+                df, columnas = self._estandarizar_columnas(df)
+                if self.usar_cache_dialectos:
+                    self._guardar_cache_dialecto(clave_cache, dialecto, columnas,
+                                                 self._huella_dialecto(archivo, dialecto))
+            decimal = dialecto['decimal']
+                
+        else:
+            raise ValueError(f"Formato no soportado: {extension}")
+        
+        columnas_requeridas = ['codigo_producto', 'nombre_producto', 'cantidad']
         
         # Seleccionar solo columnas necesarias
         df = df[columnas_requeridas].copy()
@@ -479,32 +1708,259 @@ class InventoryAnalyzer:
         df['codigo_producto'] = df['codigo_producto'].astype(str).str.strip()
         df['nombre_producto'] = df['nombre_producto'].astype(str).str.strip()
         
-        # CRÍTICO: Limpiar y convertir cantidad correctamente
-        # Manejar diferentes formatos numéricos
-        def limpiar_cantidad(val):
-            if pd.isna(val):
-                return 0
-            if isinstance(val, (int, float)):
-                return float(val)
-            # Si es string, limpiar
-            val_str = str(val).strip()
-            # Remover separadores de miles comunes
-            val_str = val_str.replace('.', '').replace(',', '.')
-            try:
-                return float(val_str)
-            except:
-                return 0
-        
-        df['cantidad'] = df['cantidad'].apply(limpiar_cantidad)
+        # CRÍTICO: Limpiar y convertir cantidad correctamente (vectorizado)
+        df['cantidad'], valores_invalidos, _ = limpiar_cantidades(df['cantidad'], decimal)
+        if valores_invalidos > 0:
+            self.logger.warning(f"⚠️ {os.path.basename(archivo)}: {valores_invalidos} cantidades no numéricas se convirtieron a 0")
         
         # Eliminar duplicados dentro del mismo archivo
         df = df.drop_duplicates(subset=['codigo_producto'], keep='first')
         
+        return df, dialecto
+    
+    def _leer_csv_con_dialecto(self, archivo, dialecto):
+        """
+        Lee un CSV completo con un dialecto ya conocido
+        
+        Args:
+            archivo: Ruta del archivo CSV
+            dialecto: Diccionario devuelto por detectar_dialecto (se actualiza si cambia la codificación)
+            
+        Returns:
+            DataFrame con las columnas originales del archivo
+        """
+        try:
+            df = pd.read_csv(
+                self._fuente_archivo(archivo),
+                encoding=dialecto['encoding'],
+                sep=dialecto['sep'],
+                decimal=dialecto['decimal'],
+                thousands=dialecto['thousands']
+            )
+        except UnicodeDecodeError:
+            # La muestra era UTF-8 válido pero el resto del archivo no
+            self.logger.warning(f"Codificación {dialecto['encoding']} inválida fuera de la muestra, reintentando con cp1252")
+            dialecto['encoding'] = 'cp1252'
+            df = pd.read_csv(
+                self._fuente_archivo(archivo),
+                encoding='cp1252',
+                encoding_errors='replace',
+                sep=dialecto['sep'],
+                decimal=dialecto['decimal'],
+                thousands=dialecto['thousands']
+            )
+        
+        # Validar que se leyeron datos
+        if df.empty or len(df.columns) == 1:
+            raise ValueError(f"El archivo parece tener un formato incorrecto. Solo se detectó 1 columna. Delimitador incorrecto?")
+        
         return df
     
+    def _estandarizar_columnas(self, df, renombrar=None, registrar_error=True):
+        """
+        Normaliza los nombres de columnas y los mapea a los nombres estándar
+        
+        Args:
+            df: DataFrame recién leído
+            renombrar: Mapeo {columna original: columna estándar} ya conocido (ej: desde caché).
+                       Si es None se calcula con MAPEO_COLUMNAS
+            registrar_error: Si True, registra en el log las columnas disponibles cuando faltan requeridas
+            
+        Returns:
+            Tupla (DataFrame con columnas estándar, mapeo de columnas aplicado)
+        """
+        df.columns = df.columns.str.lower().str.strip()
+        
+        if renombrar is None:
+            renombrar = {col_original: col_nueva for col_original, col_nueva in MAPEO_COLUMNAS.items()
+                         if col_original in df.columns}
+        df = df.rename(columns=renombrar)
+        
+        # Validar columnas requeridas
+        columnas_requeridas = ['codigo_producto', 'nombre_producto', 'cantidad']
+        columnas_faltantes = [col for col in columnas_requeridas if col not in df.columns]
+        
+        if columnas_faltantes:
+            if registrar_error:
+                self.logger.error(f"Columnas disponibles en el archivo: {list(df.columns)}")
+            raise ValueError(f"Columnas requeridas no encontradas: {columnas_faltantes}")
+        
+        return df, renombrar
+    
+    def _clave_cache_dialecto(self, archivo):
+        """Patrón de nombre del archivo con la fecha reemplazada (ej: inventario_{fecha}.csv)"""
+        return PATRON_FECHA_NOMBRE.sub('{fecha}', os.path.basename(archivo)).lower()
+    
+    def _cargar_cache_dialectos(self):
+        """Carga la caché de dialectos desde output_folder (vacía si no existe o está corrupta)"""
+        if not self.usar_cache_dialectos or not os.path.exists(self.archivo_cache_dialectos):
+            return {}
+        try:
+            with open(self.archivo_cache_dialectos, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"No se pudo leer la caché de dialectos ({str(e)}), se reconstruirá")
+            return {}
+    
+    def _escribir_cache_dialectos(self):
+        """Persiste la caché de dialectos en disco"""
+        try:
+            with open(self.archivo_cache_dialectos, 'w', encoding='utf-8') as f:
+                json.dump(self.cache_dialectos, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            self.logger.warning(f"No se pudo guardar la caché de dialectos: {str(e)}")
+    
+    def _guardar_cache_dialecto(self, clave, dialecto, columnas, huella):
+        """Registra el dialecto, el mapeo de columnas y la huella del encabezado de un patrón de archivo"""
+        with self._lock_cache:
+            self.cache_dialectos[clave] = {
+                'dialecto': {k: v for k, v in dialecto.items() if k != 'desde_cache'},
+                'columnas': columnas,
+                'huella': huella,
+                'actualizado': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            self._escribir_cache_dialectos()
+    
+    def _invalidar_cache_dialecto(self, clave):
+        """Elimina una entrada de la caché de dialectos"""
+        with self._lock_cache:
+            if self.cache_dialectos.pop(clave, None) is not None:
+                self._escribir_cache_dialectos()
+    
+    def _leer_muestra(self, archivo):
+        """Primeros BYTES_MUESTRA_DIALECTO bytes del archivo"""
+        with self._abrir_archivo(archivo) as f:
+            return f.read(BYTES_MUESTRA_DIALECTO)
+    
+    def _huella_dialecto(self, archivo, dialecto):
+        """
+        Huella de un CSV para la caché de dialectos: su primera línea (encabezado)
+        decodificada con el dialecto. El formato numérico se comprueba al leer
+        """
+        with self._abrir_archivo(archivo) as f:
+            encabezado = f.readline(BYTES_MUESTRA_DIALECTO)
+        return {'encabezado': encabezado.decode(dialecto['encoding'], errors='ignore').strip()}
+    
+    def _cantidades_sospechosas(self, archivo, dialecto, columnas):
+        """
+        Relee como texto las primeras FILAS_VERIFICACION_FORMATO cantidades de un CSV y
+        cuenta las que tienen el formato numérico contrario al del dialecto (pandas
+        quita el separador de miles en cualquier posición, así que 1234.5 leído con
+        miles '.' daría 12345 sin error). Solo lee esas líneas, sin pasar por pandas
+        
+        Args:
+            archivo: Ruta del archivo CSV
+            dialecto: Dialecto con el que se leyó
+            columnas: Mapeo {columna original: columna estándar} del archivo
+            
+        Returns:
+            Número de cantidades sospechosas
+        """
+        columna = next(original for original, estandar in columnas.items() if estandar == 'cantidad')
+        with self._abrir_archivo(archivo) as f:
+            lineas = [f.readline() for _ in range(FILAS_VERIFICACION_FORMATO + 1)]
+        texto = b''.join(lineas).decode(dialecto['encoding'], errors='replace')
+        filas = list(csv.reader(io.StringIO(texto), delimiter=dialecto['sep']))
+        if not filas:
+            return 0
+        # ValueError si la columna ya no está: quien llama descarta la entrada de la caché
+        posicion = filas[0].index(columna)
+        muestra = pd.Series([fila[posicion] for fila in filas[1:] if len(fila) > posicion], dtype=object)
+        return limpiar_cantidades(muestra, dialecto['decimal'])[2]
+    
+    def _motivo_cache_invalida(self, archivo, entrada):
+        """
+        Comprueba una entrada de la caché contra el encabezado del archivo
+        
+        Returns:
+            Texto con el motivo si la entrada ya no corresponde al archivo, o None si vale
+        """
+        huella = entrada.get('huella')
+        if huella is None:
+            return "entrada sin huella"
+        if self._huella_dialecto(archivo, entrada['dialecto'])['encabezado'] != huella['encabezado']:
+            return "el encabezado cambió"
+        return None
+    
+    def detectar_dialecto(self, archivo):
+        """
+        Detecta codificación, delimitador y formato numérico de un CSV leyendo
+        solo una muestra inicial de bytes
+        
+        Args:
+            archivo: Ruta del archivo CSV
+            
+        Returns:
+            Diccionario con las claves formato, encoding, sep, decimal y thousands
+        """
+        muestra = self._leer_muestra(archivo)
+        
+        # Codificación: BOM, luego validez UTF-8, luego cp1252 / latin-1
+        if muestra.startswith(codecs.BOM_UTF8):
+            encoding = 'utf-8-sig'
+        elif muestra.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            encoding = 'utf-16'
+        else:
+            # Descartar la última línea, puede estar cortada a mitad de un carácter
+            muestra_completa = muestra.rsplit(b'\n', 1)[0] if b'\n' in muestra else muestra
+            encoding = None
+            for candidato in ['utf-8', 'cp1252', 'latin-1']:
+                try:
+                    muestra_completa.decode(candidato)
+                    encoding = candidato
+                    break
+                except UnicodeDecodeError:
+                    continue
+        
+        lineas = lineas_muestra(muestra, encoding)
+        
+        if not lineas:
+            raise ValueError(f"No se pudo leer el archivo. Verifique el formato, codificación y delimitador.")
+        
+        # Delimitador: el candidato más frecuente en el encabezado que además
+        # aparece en todas las líneas de la muestra
+        delimitadores = [',', ';', '|', '\t']
+        encabezado = lineas[0]
+        sep = None
+        mejor_conteo = 0
+        for delim in delimitadores:
+            conteo = encabezado.count(delim)
+            if conteo > mejor_conteo and all(linea.count(delim) >= conteo for linea in lineas[1:]):
+                sep = delim
+                mejor_conteo = conteo
+        
+        if sep is None:
+            # Último intento: usar el sniffer de Python
+            try:
+                sep = csv.Sniffer().sniff('\n'.join(lineas)).delimiter
+                self.logger.warning(f"Delimitador auto-detectado: '{sep}'")
+            except csv.Error:
+                raise ValueError(f"No se pudo leer el archivo. Verifique el formato, codificación y delimitador.")
+        
+        # Formato numérico: contar evidencias de 1.234,56 frente a 1,234.56
+        votos_europeo, votos_internacional = votos_formato_numerico(lineas, sep)
+        
+        # Por defecto se asume formato europeo (1.234,56), salvo que la coma sea el delimitador
+        if votos_internacional > votos_europeo or (sep == ',' and votos_europeo == 0):
+            decimal, thousands = '.', ','
+        else:
+            decimal, thousands = ',', '.'
+        if thousands == sep:
+            thousands = None
+        
+        return {
+            'formato': 'csv',
+            'encoding': encoding,
+            'sep': sep,
+            'decimal': decimal,
+            'thousands': thousands
+        }
+    
     def calcular_variaciones(self, df_consolidado):
         """
-        Calcula la variación semanal de cada producto
+        Calcula la variación semanal de cada producto y guarda en self.reabastecimientos
+        los eventos de reabastecimiento detectados. Con pronosticar=True añade las
+        columnas de pronosticar_demanda
         
         Args:
             df_consolidado: DataFrame con todos los días
@@ -512,59 +1968,239 @@ class InventoryAnalyzer:
         Returns:
             DataFrame con variaciones calculadas
         """
-        # Ordenar por producto y fecha
-        df_sorted = df_consolidado.sort_values(['codigo_producto', 'fecha_reporte'])
-        
-        # Obtener primer y último día para cada producto
-        primer_dia = df_sorted.groupby('codigo_producto').first().reset_index()
-        ultimo_dia = df_sorted.groupby('codigo_producto').last().reset_index()
-        
-        # Calcular estadísticas
-        df_analisis = pd.DataFrame({
-            'codigo_producto': primer_dia['codigo_producto'],
-            'nombre_producto': primer_dia['nombre_producto'],
-            'cantidad_inicial': primer_dia['cantidad'],
-            'cantidad_final': ultimo_dia['cantidad'],
-            'fecha_inicial': primer_dia['fecha_reporte'],
-            'fecha_final': ultimo_dia['fecha_reporte']
-        })
+        df_variaciones, matriz, diferencias = self._variaciones_desde_consolidado(df_consolidado)
+        if self.pronosticar:
+            df_variaciones = self.agregar_pronostico(df_variaciones, matriz, diferencias)
+        return df_variaciones
+    
+    def _variaciones_desde_consolidado(self, df_consolidado):
+        """
+        Variaciones sin pronóstico, junto con la matriz y sus diferencias diarias
+        para no recalcularlas en agregar_pronostico
         
-        # Calcular variación (consumo = inicial - final)
-        df_analisis['variacion_semanal'] = df_analisis['cantidad_inicial'] - df_analisis['cantidad_final']
+        Returns:
+            Tupla (df_variaciones, matriz, diferencias)
+        """
+        matriz = MatrizInventario.desde_consolidado(df_consolidado)
+        diferencias = matriz.diferencias_diarias()
+        self.reabastecimientos = matriz.eventos_reabastecimiento(diferencias)
+        estado = self.estado_desde_matriz(matriz, diferencias)
+        return self._variaciones_desde_estado(estado), matriz, diferencias
+    
+    def agregar_pronostico(self, df_variaciones, matriz, diferencias):
+        """
+        Añade a las variaciones las columnas de pronosticar_demanda (etapa 'pronostico')
+        
+        Args:
+            df_variaciones: DataFrame con variaciones calculadas
+            matriz: MatrizInventario de la que salen las variaciones
+            diferencias: Resultado de matriz.diferencias_diarias()
+            
+        Returns:
+            DataFrame con variaciones y pronóstico
+        """
+        with self._medir_etapa('pronostico', len(df_variaciones)) as etapa:
+            pronostico = pronosticar_demanda(
+                matriz, diferencias,
+                modelo=self.modelo_pronostico,
+                alfa=self.alfa_pronostico,
+                dias_cobertura=self.dias_cobertura_pronostico
+            )
+            df_variaciones = df_variaciones.join(pronostico, on='codigo_producto')
+            etapa['filas_salida'] = len(pronostico)
+        self.logger.info(f"🔮 Pronóstico ({self.modelo_pronostico}): "
+                         f"{int((pronostico['dias_hasta_agotarse'] <= self.dias_cobertura_pronostico).sum())} "
+                         f"productos se agotarían en {self.dias_cobertura_pronostico} días o menos")
+        return df_variaciones
+    
+    def construir_estado(self, df_consolidado):
+        """
+        Resume el histórico en el estado acumulado por producto
+        
+        Args:
+            df_consolidado: DataFrame con todos los días
+            
+        Returns:
+            DataFrame indexado por codigo_producto: primer/último registro (cantidad y fecha),
+            suma de cantidades, días con registro, días operativos transcurridos, variación máxima
+            diaria, consumo acumulado (suma de las bajadas diarias) y unidades y número de
+            reabastecimientos (subidas)
+        """
+        return self.estado_desde_matriz(MatrizInventario.desde_consolidado(df_consolidado))
+    
+    def estado_desde_matriz(self, matriz, diferencias=None):
+        """
+        Calcula el estado acumulado por producto con reducciones por filas de la matriz
+        
+        Args:
+            matriz: MatrizInventario
+            diferencias: Resultado de matriz.diferencias_diarias(), si ya se calculó
+            
+        Returns:
+            DataFrame indexado por codigo_producto (mismas columnas que construir_estado)
+        """
+        cantidades = matriz.cantidades
+        filas = np.arange(cantidades.shape[0])
+        primer_dia = matriz.primer_dia()
+        ultimo_dia = matriz.ultimo_dia()
+        if diferencias is None:
+            diferencias = matriz.diferencias_diarias()
+        posicion = matriz.posiciones_operativas(self.dias_operativos)
+        
+        return pd.DataFrame({
+            'nombre_producto': matriz.nombres,
+            'cantidad_inicial': cantidades[filas, primer_dia],
+            'cantidad_final': cantidades[filas, ultimo_dia],
+            'fecha_inicial': matriz.fechas.take(primer_dia),
+            'fecha_final': matriz.fechas.take(ultimo_dia),
+            'suma_cantidad': np.nansum(cantidades, axis=1),
+            'dias_con_registro': matriz.validos().sum(axis=1),
+            # Días operativos entre el primer y el último registro (cuenta los días sin archivo)
+            'dias_transcurridos': posicion[ultimo_dia] - posicion[primer_dia],
+            # fmax ignora NaN (queda NaN si el producto tiene un solo registro)
+            'variacion_maxima_diaria': np.fmax.reduce(diferencias, axis=1),
+            # Bajadas de un registro al siguiente = consumo; subidas = reabastecimientos
+            'consumo_acumulado': np.nansum(np.fmax(-diferencias, 0), axis=1),
+            'reabastecido_acumulado': np.nansum(np.fmax(diferencias, 0), axis=1),
+            'reabastecimientos': (diferencias > 0).sum(axis=1)
+        }, index=matriz.codigos)
+    
+    def cargar_matriz(self, fecha_inicio, fecha_fin):
+        """
+        Carga un rango de fechas directamente en formato matriz (ej: análisis de tendencias
+        de varias semanas)
         
-        # Identificar posibles reabastecimientos (variación negativa)
-        df_analisis['posible_reabastecimiento'] = df_analisis['variacion_semanal'] < 0
+        Args:
+            fecha_inicio: Fecha de inicio del rango
+            fecha_fin: Fecha fin del rango
+            
+        Returns:
+            Tupla (MatrizInventario, dias_faltantes)
+        """
+        df_consolidado, dias_faltantes = self.cargar_archivos_semana(
+            fecha_inicio_filtro=fecha_inicio,
+            fecha_fin_filtro=fecha_fin
+        )
+        return MatrizInventario.desde_consolidado(df_consolidado), dias_faltantes
+    
+    def actualizar_estado(self, estado, df_dia, fecha):
+        """
+        Incorpora un nuevo día al estado acumulado en O(productos), sin releer días anteriores.
+        Los reabastecimientos del día quedan en self.reabastecimientos
+        
+        Args:
+            estado: Estado acumulado (construir_estado o cargar_estado_incremental)
+            df_dia: DataFrame normalizado del nuevo día (salida de leer_archivo)
+            fecha: Fecha del nuevo día
+            
+        Returns:
+            Nuevo estado acumulado
+        """
+        fecha = pd.Timestamp(fecha)
+        if len(estado) > 0 and estado['fecha_final'].max() >= fecha:
+            raise ValueError(f"El estado ya incluye datos del {fecha.strftime('%Y-%m-%d')} o posteriores")
+        
+        dia = df_dia.drop_duplicates(subset=['codigo_producto']).set_index('codigo_producto')
+        existentes = dia.index.intersection(estado.index)
+        nuevos = dia.index.difference(estado.index)
+        
+        # Productos ya conocidos: la variación diaria es contra su último registro
+        estado = estado.copy()
+        cantidad = dia.loc[existentes, 'cantidad']
+        var_diaria = cantidad - estado.loc[existentes, 'cantidad_final']
+        estado.loc[existentes, 'variacion_maxima_diaria'] = np.fmax(estado.loc[existentes, 'variacion_maxima_diaria'], var_diaria)
+        estado.loc[existentes, 'consumo_acumulado'] += np.maximum(-var_diaria, 0)
+        estado.loc[existentes, 'reabastecido_acumulado'] += np.maximum(var_diaria, 0)
+        estado.loc[existentes, 'reabastecimientos'] += (var_diaria > 0).astype(int)
+        subidas = var_diaria[var_diaria > 0]
+        self.reabastecimientos = pd.DataFrame({
+            'codigo_producto': subidas.index,
+            'nombre_producto': dia.loc[subidas.index, 'nombre_producto'].to_numpy(),
+            'fecha_reporte': fecha,
+            'cantidad_anterior': cantidad[subidas.index].to_numpy() - subidas.to_numpy(),
+            'cantidad': cantidad[subidas.index].to_numpy(),
+            'unidades_reabastecidas': subidas.to_numpy()
+        }).sort_values('codigo_producto', ignore_index=True)
+        estado.loc[existentes, 'dias_transcurridos'] += self._dias_operativos_entre(
+            estado.loc[existentes, 'fecha_final'], fecha
+        )
+        estado.loc[existentes, 'cantidad_final'] = cantidad
+        estado.loc[existentes, 'fecha_final'] = fecha
+        estado.loc[existentes, 'suma_cantidad'] += cantidad
+        estado.loc[existentes, 'dias_con_registro'] += 1
+        
+        # Productos nuevos: este día es su primer registro
+        cantidad = dia.loc[nuevos, 'cantidad']
+        nuevos_estado = pd.DataFrame({
+            'nombre_producto': dia.loc[nuevos, 'nombre_producto'],
+            'cantidad_inicial': cantidad,
+            'cantidad_final': cantidad,
+            'fecha_inicial': fecha,
+            'fecha_final': fecha,
+            'suma_cantidad': cantidad,
+            'dias_con_registro': 1,
+            'dias_transcurridos': 0,
+            'variacion_maxima_diaria': np.nan,
+            'consumo_acumulado': 0.0,
+            'reabastecido_acumulado': 0.0,
+            'reabastecimientos': 0
+        }, index=nuevos)
+        
+        if len(estado) == 0:
+            return nuevos_estado
+        return pd.concat([estado, nuevos_estado]) if len(nuevos_estado) > 0 else estado
+    
+    def _dias_operativos_entre(self, desde, hasta):
+        """
+        Días operativos transcurridos de desde a hasta (se cuenta hasta, no desde); coincide
+        con la diferencia de MatrizInventario.posiciones_operativas(self.dias_operativos)
+        
+        Args:
+            desde: Fecha o Serie de fechas de partida
+            hasta: Fecha o Serie de fechas de llegada
+            
+        Returns:
+            Array de enteros
+        """
+        un_dia = np.timedelta64(1, 'D')
+        desde = np.asarray(desde, dtype='datetime64[D]') + un_dia
+        hasta = np.asarray(hasta, dtype='datetime64[D]') + un_dia
+        return np.busday_count(desde, hasta, weekmask=self.dias_operativos)
+    
+    def _variaciones_desde_estado(self, estado):
+        """
+        Calcula las variaciones de cada producto a partir del estado acumulado
+        
+        Args:
+            estado: DataFrame indexado por codigo_producto (construir_estado / actualizar_estado)
+            
+        Returns:
+            DataFrame con variaciones calculadas
+        """
+        df_analisis = estado.rename_axis('codigo_producto').sort_index().reset_index()
         
         # Calcular promedio de stock (promedio de todas las cantidades registradas)
-        promedios_stock = df_consolidado.groupby('codigo_producto')['cantidad'].mean().reset_index()
-        promedios_stock.rename(columns={'cantidad': 'promedio_stock'}, inplace=True)
-        df_analisis = df_analisis.merge(promedios_stock, on='codigo_producto', how='left')
-        
-        # Contar días con registro
-        dias_registro = df_consolidado.groupby('codigo_producto').size().reset_index(name='dias_con_registro')
-        df_analisis = df_analisis.merge(dias_registro, on='codigo_producto', how='left')
-        
-        # NUEVO: Calcular consumo promedio diario
-        def calcular_consumo_diario(row):
-            if row['dias_con_registro'] > 1 and not row['posible_reabastecimiento']:
-                # Solo calcular para productos con consumo real (no reabastecimientos)
-                return row['variacion_semanal'] / row['dias_con_registro']
-            elif row['posible_reabastecimiento']:
-                # Si hubo reabastecimiento, no podemos calcular consumo real
-                return 0
-            else:
-                return 0
+        df_analisis['promedio_stock'] = df_analisis['suma_cantidad'] / df_analisis['dias_con_registro']
+        df_analisis = df_analisis.drop(columns='suma_cantidad')
         
-        df_analisis['consumo_promedio_diario'] = df_analisis.apply(calcular_consumo_diario, axis=1)
+        # Calcular variación neta del periodo (inicial - final)
+        df_analisis['variacion_semanal'] = df_analisis['cantidad_inicial'] - df_analisis['cantidad_final']
+        
+        # Reabastecimientos: alguna subida de stock de un registro al siguiente
+        df_analisis['posible_reabastecimiento'] = df_analisis['reabastecimientos'] > 0
+        
+        # Consumo promedio diario: suma de las bajadas diarias entre los días operativos
+        # transcurridos (una bajada que abarca un día sin archivo cuenta dos días). Las
+        # subidas no restan, así que sigue siendo válido aunque haya habido reabastecimientos
+        dias = df_analisis['dias_transcurridos']
+        df_analisis['consumo_promedio_diario'] = np.where(
+            dias > 0,
+            df_analisis['consumo_acumulado'] / dias.clip(lower=1),
+            0.0
+        )
         
-        # Calcular variación máxima diaria para detectar reabastecimientos
-        df_analisis['variacion_maxima_diaria'] = 0
-        for producto in df_analisis['codigo_producto'].unique():
-            datos_prod = df_sorted[df_sorted['codigo_producto'] == producto].copy()
-            if len(datos_prod) > 1:
-                datos_prod['var_diaria'] = datos_prod['cantidad'].diff()
-                max_var = datos_prod['var_diaria'].max()
-                df_analisis.loc[df_analisis['codigo_producto'] == producto, 'variacion_maxima_diaria'] = max_var
+        # Variación máxima diaria para detectar reabastecimientos (0 si solo hay un registro)
+        df_analisis['variacion_maxima_diaria'] = df_analisis['variacion_maxima_diaria'].fillna(0)
         
         # Excluir productos sin movimiento significativo
         # Excluir si: variación = 0 O solo aparece 1 día
@@ -576,92 +2212,104 @@ class InventoryAnalyzer:
         # Log de reabastecimientos detectados
         reabastecimientos = df_analisis[df_analisis['posible_reabastecimiento'] == True]
         if len(reabastecimientos) > 0:
-            self.logger.warning(f"⚠️ Se detectaron {len(reabastecimientos)} productos con posible reabastecimiento (variación negativa)")
-            self.logger.warning("   Estos productos se marcarán como 'Revisar' en el reporte")
+            self.logger.warning(f"⚠️ Se detectaron {len(reabastecimientos)} productos con reabastecimiento "
+                                f"({int(reabastecimientos['reabastecimientos'].sum())} entradas de stock)")
+            self.logger.warning("   Su consumo se calcula solo con las bajadas diarias de stock")
         
         self.logger.info(f"Productos con movimiento significativo: {len(df_analisis)}")
-        self.logger.info(f"  - Con consumo (variación positiva): {len(df_analisis[df_analisis['variacion_semanal'] > 0])}")
-        self.logger.info(f"  - Con posible reabastecimiento: {len(reabastecimientos)}")
+        self.logger.info(f"  - Con consumo: {len(df_analisis[df_analisis['consumo_acumulado'] > 0])}")
+        self.logger.info(f"  - Con reabastecimiento: {len(reabastecimientos)}")
+        self.logger.info(f"  - Con variación neta negativa (a revisar): {len(df_analisis[df_analisis['variacion_semanal'] < 0])}")
         
         return df_analisis
     
-    def calcular_alertas(self, df_analisis):
+    def _evaluar_reglas_alerta(self, df_analisis, factor_promedio, stock_minimo_global):
         """
-        Calcula el indicador de alerta basado en stock mínimo y porcentaje de abastecimiento
+        Evalúa las reglas de alerta sin modificar el DataFrame, para poder
+        repetirlas con otra configuración de stock mínimo
         
         Args:
             df_analisis: DataFrame con variaciones
+            factor_promedio: Factor de cobertura sobre el consumo o stock promedio
+            stock_minimo_global: Stock mínimo por defecto
             
         Returns:
-            DataFrame con columnas de alerta y reabastecimiento
+            Tupla (stock_minimo, porcentaje_abastecimiento, codigos_estado) como arrays,
+            donde los códigos indexan ESTADOS_ALERTA
         """
+        consumo = df_analisis['consumo_promedio_diario'].to_numpy(dtype=float)
+        promedio = df_analisis['promedio_stock'].to_numpy(dtype=float)
+        inicial = df_analisis['cantidad_inicial'].to_numpy(dtype=float)
+        final = df_analisis['cantidad_final'].to_numpy(dtype=float)
+        variacion = df_analisis['variacion_semanal'].to_numpy(dtype=float)
+        
         # Calcular stock mínimo por producto
-        def calcular_stock_minimo(row):
-            if self.usar_promedio_semanal:
-                # Opción A: Basado en consumo promedio diario
-                if row['consumo_promedio_diario'] > 0:
-                    # Stock mínimo = Consumo diario × factor × 7 (días)
+        if self.usar_promedio_semanal:
+            stock_minimo = np.select(
+                [consumo > 0, promedio > 0],
+                [
+                    # Opción A: Stock mínimo = Consumo diario × factor × 7 (días)
                     # Si factor = 0.5, cubre 3.5 días de consumo
-                    return row['consumo_promedio_diario'] * self.factor_promedio * 7
-                # Opción B: Si no hay consumo calculable, usar promedio de stock
-                elif row['promedio_stock'] > 0:
-                    return row['promedio_stock'] * self.factor_promedio
-                else:
-                    return self.stock_minimo_global
-            else:
-                # Stock mínimo global
-                return self.stock_minimo_global
-        
-        df_analisis['stock_minimo'] = df_analisis.apply(calcular_stock_minimo, axis=1)
-        
-        # Calcular porcentaje de abastecimiento
-        def calcular_porcentaje(row):
-            if row['cantidad_inicial'] > 0:
-                return (row['cantidad_final'] / row['cantidad_inicial']) * 100
-            else:
-                return 100  # Si no había stock inicial, considerar 100%
-        
-        df_analisis['porcentaje_abastecimiento'] = df_analisis.apply(calcular_porcentaje, axis=1)
-        
-        # Evaluar estado según las nuevas reglas
-        def evaluar_estado(row):
-            stock_final = row['cantidad_final']
-            stock_minimo = row['stock_minimo']
-            porcentaje = row['porcentaje_abastecimiento']
-            variacion = row['variacion_semanal']
-            
-            # Caso especial: Posible reabastecimiento (variación negativa)
-            if variacion < 0:
-                return '🔵 REVISAR (Posible Reabastecimiento)'
-            
-            # Reglas de negocio según tu especificación
-            if stock_final <= 0:
-                return '🔴 SIN EXISTENCIAS'
-            elif stock_final <= stock_minimo:
-                return '🟠 BAJO STOCK'
-            elif porcentaje < 30:
-                return '🟡 EN DESCENSO'
-            else:
-                return '🟢 NORMAL'
+                    consumo * factor_promedio * 7,
+                    # Opción B: Si no hay consumo calculable, usar promedio de stock
+                    promedio * factor_promedio
+                ],
+                default=stock_minimo_global
+            )
+        else:
+            # Stock mínimo global
+            stock_minimo = np.full(len(df_analisis), stock_minimo_global, dtype=float)
+        
+        # Calcular porcentaje de abastecimiento (100% si no había stock inicial)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            porcentaje = np.where(inicial > 0, final / inicial * 100, 100.0)
+        
+        # Evaluar estado según las reglas de negocio, en orden de precedencia.
+        # Un producto reabastecido (variación negativa) se evalúa igual contra el stock
+        # mínimo, que ya descuenta las entradas; solo si queda cubierto pasa a revisión
+        codigos_estado = np.select(
+            [
+                final <= 0,
+                final <= stock_minimo,
+                variacion < 0,
+                porcentaje < 30
+            ],
+            [
+                ESTADOS_ALERTA.index(ESTADO_SIN_EXISTENCIAS),
+                ESTADOS_ALERTA.index(ESTADO_BAJO_STOCK),
+                ESTADOS_ALERTA.index(ESTADO_REVISAR),
+                ESTADOS_ALERTA.index(ESTADO_EN_DESCENSO)
+            ],
+            default=ESTADOS_ALERTA.index(ESTADO_NORMAL)
+        )
         
-        df_analisis['alerta'] = df_analisis.apply(evaluar_estado, axis=1)
+        return stock_minimo, porcentaje, codigos_estado
+    
+    def calcular_alertas(self, df_analisis):
+        """
+        Calcula el indicador de alerta basado en stock mínimo y porcentaje de abastecimiento
         
-        # Calcular cantidad a reabastecer
-        def calcular_reabastecer(row):
-            if row['variacion_semanal'] < 0:
-                # Si hubo reabastecimiento, no calcular
-                return 0
-            else:
-                # Cuánto falta para llegar al stock mínimo
-                return max(0, row['stock_minimo'] - row['cantidad_final'])
+        Args:
+            df_analisis: DataFrame con variaciones
+            
+        Returns:
+            DataFrame con columnas de alerta y reabastecimiento
+        """
+        stock_minimo, porcentaje, codigos_estado = self._evaluar_reglas_alerta(
+            df_analisis, self.factor_promedio, self.stock_minimo_global
+        )
+        final = df_analisis['cantidad_final'].to_numpy(dtype=float)
         
-        df_analisis['cantidad_reabastecer'] = df_analisis.apply(calcular_reabastecer, axis=1)
+        df_analisis['stock_minimo'] = stock_minimo
+        df_analisis['porcentaje_abastecimiento'] = porcentaje
+        df_analisis['alerta'] = pd.Categorical.from_codes(codigos_estado, categories=ESTADOS_ALERTA)
         
-        # Actualizar la columna posible_reabastecimiento
-        df_analisis['posible_reabastecimiento'] = df_analisis['variacion_semanal'] < 0
+        # Calcular cantidad a reabastecer: cuánto falta para llegar al stock mínimo
+        df_analisis['cantidad_reabastecer'] = np.maximum(0, stock_minimo - final)
         
         # Estadísticas de alertas
         conteo_alertas = df_analisis['alerta'].value_counts()
+        conteo_alertas = conteo_alertas[conteo_alertas > 0]
         self.logger.info("="*60)
         self.logger.info("Distribución de alertas:")
         for alerta, cantidad in conteo_alertas.items():
@@ -686,16 +2334,40 @@ class InventoryAnalyzer:
         
         return df_analisis
     
-    def generar_reporte(self, df_analisis, dias_faltantes):
+    def barrido_alertas(self, df_analisis, factores):
         """
-        Genera el archivo de reporte consolidado
+        Cuenta cuántos productos caen en cada estado para varios factores de
+        stock mínimo, sin modificar el DataFrame ni escribir en el log
+        
+        Args:
+            df_analisis: DataFrame con variaciones
+            factores: Iterable de valores de factor_promedio a evaluar
+            
+        Returns:
+            DataFrame con una fila por factor y una columna por estado de alerta
+        """
+        filas = []
+        for factor in factores:
+            _, _, codigos_estado = self._evaluar_reglas_alerta(
+                df_analisis, factor, self.stock_minimo_global
+            )
+            filas.append(np.bincount(codigos_estado, minlength=len(ESTADOS_ALERTA)))
+        
+        barrido = pd.DataFrame(filas, columns=ESTADOS_ALERTA)
+        barrido.index = pd.Index(list(factores), name='factor_promedio')
+        return barrido
+    
+    def preparar_reporte(self, df_analisis, dias_faltantes, reabastecimientos=None):
+        """
+        Prepara las tablas del reporte en memoria, sin escribir ningún archivo
         
         Args:
             df_analisis: DataFrame con el análisis completo
             dias_faltantes: Lista de días sin archivo
+            reabastecimientos: Eventos de reabastecimiento (hoja adicional del reporte), opcional
             
         Returns:
-            Ruta del archivo generado
+            ResultadoAnalisis con la tabla exportable, el resumen y los días faltantes
         """
         # Ordenar por alerta (críticas primero) y variación
         orden_alertas = {'🔴 CRÍTICA': 0, '🟠 MEDIA': 1, '🟡 MODERADA': 2, '🟢 ESTABLE': 3}
@@ -706,7 +2378,8 @@ class InventoryAnalyzer:
         # Preparar DataFrame para exportación
         df_export = df_reporte[[
             'codigo_producto', 'nombre_producto', 'cantidad_inicial', 'cantidad_final',
-            'variacion_semanal', 'consumo_promedio_diario', 'promedio_stock', 
+            'variacion_semanal', 'consumo_acumulado', 'reabastecimientos',
+            'consumo_promedio_diario', 'promedio_stock', 
             'stock_minimo', 'porcentaje_abastecimiento',
             'cantidad_reabastecer', 'dias_con_registro', 'posible_reabastecimiento',
             'alerta', 'fecha_inicial', 'fecha_final'
@@ -716,6 +2389,8 @@ class InventoryAnalyzer:
         df_export['cantidad_inicial'] = df_export['cantidad_inicial'].round(0).astype(int)
         df_export['cantidad_final'] = df_export['cantidad_final'].round(0).astype(int)
         df_export['variacion_semanal'] = df_export['variacion_semanal'].round(0).astype(int)
+        df_export['consumo_acumulado'] = df_export['consumo_acumulado'].round(0).astype(int)
+        df_export['reabastecimientos'] = df_export['reabastecimientos'].astype(int)
         df_export['consumo_promedio_diario'] = df_export['consumo_promedio_diario'].round(2)
         df_export['promedio_stock'] = df_export['promedio_stock'].round(1)
         df_export['stock_minimo'] = df_export['stock_minimo'].round(0).astype(int)
@@ -725,89 +2400,96 @@ class InventoryAnalyzer:
         # Renombrar columnas para el reporte
         df_export.columns = [
             'Código', 'Producto', 'Stock Inicial', 'Stock Final',
-            'Variación Total', 'Consumo Diario', 'Promedio Stock', 'Stock Mínimo', '% Abastecimiento',
+            'Variación Total', 'Consumo Total', 'Reabastecimientos', 'Consumo Diario', 'Promedio Stock', 'Stock Mínimo', '% Abastecimiento',
             'Cantidad a Reabastecer', 'Días Registrados', 'Posible Reabastecimiento',
             'Estado', 'Fecha Inicio', 'Fecha Fin'
         ]
         
-        # Generar nombre de archivo
-        fecha_reporte = datetime.now().strftime('%Y%m%d_%H%M%S')
-        archivo_salida = os.path.join(self.output_folder, f'reporte_inventario_semana_{fecha_reporte}.xlsx')
-        
-        # Crear Excel con formato
-        with pd.ExcelWriter(archivo_salida, engine='openpyxl') as writer:
-            # Hoja principal con datos
-            df_export.to_excel(writer, sheet_name='Reporte Semanal', index=False)
-            
-            # Hoja de resumen
-            productos_revisar = len(df_export[df_export['Estado'] == '🔵 REVISAR (Posible Reabastecimiento)'])
-            productos_sin_existencias = len(df_export[df_export['Estado'] == '🔴 SIN EXISTENCIAS'])
-            productos_bajo_stock = len(df_export[df_export['Estado'] == '🟠 BAJO STOCK'])
-            productos_descenso = len(df_export[df_export['Estado'] == '🟡 EN DESCENSO'])
-            productos_normales = len(df_export[df_export['Estado'] == '🟢 NORMAL'])
-            total_reabastecer = df_export['Cantidad a Reabastecer'].sum()
-            
-            df_resumen = pd.DataFrame({
-                'Métrica': [
-                    'Fecha de Generación',
-                    'Total Productos Analizados',
-                    'Productos Sin Existencias',
-                    'Productos con Bajo Stock',
-                    'Productos En Descenso',
-                    'Productos Normales',
-                    'Productos a Revisar (Posible Reabastecimiento)',
-                    'Total Unidades a Reabastecer',
-                    'Días Analizados (Total)',
-                    'Días Laborables (L-V)',
-                    'Jornadas Extraordinarias (S-D)',
-                    'Días Sin Archivo',
-                    'Configuración: Stock Mínimo',
-                    'Configuración: Factor Promedio Semanal'
-                ],
-                'Valor': [
-                    datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    len(df_export),
-                    productos_sin_existencias,
-                    productos_bajo_stock,
-                    productos_descenso,
-                    productos_normales,
-                    productos_revisar,
-                    f"{total_reabastecer:.0f} unidades",
-                    df_export['Días Registrados'].max(),
-                    len([d for d in dias_faltantes if 'Monday' not in d and 'Tuesday' not in d and 
-                        'Wednesday' not in d and 'Thursday' not in d and 'Friday' not in d]),
-                    df_export['Días Registrados'].max() - len([d for d in dias_faltantes if 
-                        'Monday' not in d and 'Tuesday' not in d and 'Wednesday' not in d and 
-                        'Thursday' not in d and 'Friday' not in d]),
-                    ', '.join(dias_faltantes) if dias_faltantes else 'Ninguno',
-                    f"Basado en promedio semanal x {self.factor_promedio}" if self.usar_promedio_semanal else f"{self.stock_minimo_global} unidades",
-                    f"{self.factor_promedio * 100:.0f}% del promedio" if self.usar_promedio_semanal else "No aplica"
-                ]
+        # Columnas del pronóstico de demanda (solo si se calculó)
+        if 'dias_hasta_agotarse' in df_reporte.columns:
+            df_export['Demanda Diaria Pronosticada'] = df_reporte['demanda_diaria_pronostico'].round(2)
+            df_export['Días hasta Agotarse'] = df_reporte['dias_hasta_agotarse'].round(1)
+            df_export['Reabastecer según Pronóstico'] = df_reporte['cantidad_reabastecer_pronostico'].astype(int)
+        
+        # Métricas del resumen
+        dias_analizados = int(df_export['Días Registrados'].max()) if len(df_export) > 0 else 0
+        fines_semana_faltantes = len([d for d in dias_faltantes if 'Monday' not in d and 'Tuesday' not in d and 
+                                      'Wednesday' not in d and 'Thursday' not in d and 'Friday' not in d])
+        resumen = {
+            'fecha_generacion': datetime.now(),
+            'total_productos': len(df_export),
+            'sin_existencias': int((df_export['Estado'] == ESTADO_SIN_EXISTENCIAS).sum()),
+            'bajo_stock': int((df_export['Estado'] == ESTADO_BAJO_STOCK).sum()),
+            'en_descenso': int((df_export['Estado'] == ESTADO_EN_DESCENSO).sum()),
+            'normales': int((df_export['Estado'] == ESTADO_NORMAL).sum()),
+            'revisar': int((df_export['Estado'] == ESTADO_REVISAR).sum()),
+            'total_reabastecer': int(df_export['Cantidad a Reabastecer'].sum()),
+            'dias_analizados': dias_analizados,
+            'dias_laborables': fines_semana_faltantes,
+            'jornadas_extraordinarias': dias_analizados - fines_semana_faltantes,
+            'dias_sin_archivo': list(dias_faltantes),
+            'config_stock_minimo': f"Basado en promedio semanal x {self.factor_promedio}" if self.usar_promedio_semanal else f"{self.stock_minimo_global} unidades",
+            'config_factor_promedio': f"{self.factor_promedio * 100:.0f}% del promedio" if self.usar_promedio_semanal else "No aplica"
+        }
+        
+        df_reabastecimientos = None
+        if reabastecimientos is not None:
+            df_reabastecimientos = reabastecimientos.rename(columns={
+                'codigo_producto': 'Código',
+                'nombre_producto': 'Producto',
+                'fecha_reporte': 'Fecha',
+                'cantidad_anterior': 'Stock Anterior',
+                'cantidad': 'Stock Nuevo',
+                'unidades_reabastecidas': 'Unidades Reabastecidas'
             })
-            df_resumen.to_excel(writer, sheet_name='Resumen', index=False)
-            
-            # Ajustar ancho de columnas
-            for sheet_name in writer.sheets:
-                worksheet = writer.sheets[sheet_name]
-                for column in worksheet.columns:
-                    max_length = 0
-                    column = [cell for cell in column]
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(cell.value)
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
-        
-        self.logger.info(f"Reporte generado exitosamente: {archivo_salida}")
-        return archivo_salida, df_export
+        
+        return ResultadoAnalisis(df_export=df_export, resumen=resumen, dias_faltantes=list(dias_faltantes),
+                                 df_reabastecimientos=df_reabastecimientos)
     
-    def ejecutar_analisis_completo(self, semana_inicio=None, fecha_inicio_filtro=None, 
-                                   fecha_fin_filtro=None):
+    def generar_reporte(self, df_analisis, dias_faltantes, reabastecimientos=None):
         """
-        Ejecuta el proceso completo de análisis y genera el reporte
+        Genera el archivo de reporte consolidado
+        
+        Args:
+            df_analisis: DataFrame con el análisis completo
+            dias_faltantes: Lista de días sin archivo
+            reabastecimientos: Eventos de reabastecimiento (hoja adicional del reporte), opcional
+            
+        Returns:
+            Ruta del archivo generado
+        """
+        resultado = self.preparar_reporte(df_analisis, dias_faltantes, reabastecimientos)
+        archivo_salida = self.guardar_reporte(resultado)
+        return archivo_salida, resultado.df_export
+    
+    def guardar_reporte(self, resultado):
+        """
+        Escribe el reporte de un resultado en output_folder, en el formato output_format
+        
+        Args:
+            resultado: ResultadoAnalisis devuelto por preparar_reporte / ejecutar_analisis
+            
+        Returns:
+            Ruta del archivo generado (el reporte principal)
+        """
+        fecha_reporte = datetime.now().strftime('%Y%m%d_%H%M%S')
+        extension = EXTENSIONES_FORMATO[self.output_format]
+        archivo_salida = os.path.join(self.output_folder, f'reporte_inventario_semana_{fecha_reporte}{extension}')
+        with self._trazar_memoria(), self._medir_etapa('escritura_reporte', len(resultado.df_export)) as etapa:
+            archivos_escritos = resultado.exportar(archivo_salida, self.output_format)
+            etapa['filas_salida'] = len(resultado.df_export)
+        resultado.archivo_reporte = archivo_salida
+        
+        for archivo in archivos_escritos:
+            self.logger.info(f"Reporte generado exitosamente: {archivo}")
+        self.guardar_perfil()
+        return archivo_salida
+    
+    def cargar_variaciones(self, semana_inicio=None, fecha_inicio_filtro=None,
+                           fecha_fin_filtro=None):
+        """
+        Etapas de carga y cálculo de variaciones, que no dependen de la
+        configuración de stock mínimo y pueden memorizarse entre ejecuciones
         
         Args:
             semana_inicio: Fecha de inicio de semana (para modo semana)
@@ -815,28 +2497,94 @@ class InventoryAnalyzer:
             fecha_fin_filtro: Fecha fin para rango personalizado
         
         Returns:
-            Ruta del archivo de reporte generado
+            Tupla (df_variaciones, dias_faltantes)
         """
-        try:
-            self.logger.info("="*80)
-            self.logger.info("INICIO DEL ANÁLISIS SEMANAL DE INVENTARIO")
-            self.logger.info("="*80)
-            
-            # 1. Cargar archivos (con o sin rango personalizado)
+        lecturas_previas = len(self.perfil['lecturas'])
+        with self._medir_etapa('carga') as etapa:
             df_consolidado, dias_faltantes = self.cargar_archivos_semana(
                 semana_inicio=semana_inicio,
                 fecha_inicio_filtro=fecha_inicio_filtro,
                 fecha_fin_filtro=fecha_fin_filtro
             )
-            
-            # 2. Calcular variaciones
-            df_analisis = self.calcular_variaciones(df_consolidado)
-            
-            # 3. Calcular alertas
+            # Con lectura en paralelo las lecturas llegan en orden de finalización
+            lecturas = sorted(self.perfil['lecturas'][lecturas_previas:], key=lambda l: l['fecha'])
+            self.perfil['lecturas'][lecturas_previas:] = lecturas
+            etapa['filas_entrada'] = sum(l['filas'] for l in lecturas)
+            etapa['filas_salida'] = len(df_consolidado)
+        
+        with self._medir_etapa('variaciones', len(df_consolidado)) as etapa:
+            df_variaciones, matriz, diferencias = self._variaciones_desde_consolidado(df_consolidado)
+            etapa['filas_salida'] = len(df_variaciones)
+        
+        # El pronóstico es una etapa aparte, después de variaciones
+        if self.pronosticar:
+            df_variaciones = self.agregar_pronostico(df_variaciones, matriz, diferencias)
+        
+        return df_variaciones, dias_faltantes
+    
+    def resultado_desde_variaciones(self, df_variaciones, dias_faltantes, copiar=True,
+                                    reabastecimientos=None):
+        """
+        Etapas de alertas y reporte a partir de variaciones ya calculadas,
+        p.ej. al cambiar solo el stock mínimo o el factor
+        
+        Args:
+            df_variaciones: DataFrame devuelto por calcular_variaciones
+            dias_faltantes: Lista de días sin archivo
+            copiar: Si True, trabaja sobre una copia para no alterar df_variaciones
+            reabastecimientos: Eventos de reabastecimiento de calcular_variaciones
+                               (self.reabastecimientos del analizador que las calculó)
+        
+        Returns:
+            ResultadoAnalisis
+        """
+        with self._medir_etapa('alertas', len(df_variaciones)) as etapa:
+            df_analisis = df_variaciones.copy() if copiar else df_variaciones
             df_analisis = self.calcular_alertas(df_analisis)
+            etapa['filas_salida'] = len(df_analisis)
+        
+        with self._medir_etapa('preparar_reporte', len(df_analisis)) as etapa:
+            resultado = self.preparar_reporte(df_analisis, dias_faltantes, reabastecimientos)
+            etapa['filas_salida'] = len(resultado.df_export)
+        
+        resultado.perfil = self.perfil
+        resultado.df_analisis = df_analisis
+        return resultado
+    
+    def ejecutar_analisis(self, semana_inicio=None, fecha_inicio_filtro=None, 
+                          fecha_fin_filtro=None):
+        """
+        Ejecuta el proceso completo de análisis y devuelve el resultado en memoria
+        (el Excel se genera aparte con guardar_reporte o ResultadoAnalisis.a_excel)
+        
+        Args:
+            semana_inicio: Fecha de inicio de semana (para modo semana)
+            fecha_inicio_filtro: Fecha inicio para rango personalizado
+            fecha_fin_filtro: Fecha fin para rango personalizado
+        
+        Returns:
+            ResultadoAnalisis
+        """
+        try:
+            self.logger.info("="*80)
+            self.logger.info("INICIO DEL ANÁLISIS SEMANAL DE INVENTARIO")
+            self.logger.info("="*80)
             
-            # 4. Generar reporte
-            archivo_reporte, df_export = self.generar_reporte(df_analisis, dias_faltantes)
+            self.perfil = self._nuevo_perfil()
+            with self._trazar_memoria():
+                # 1-2. Cargar archivos y calcular variaciones
+                df_variaciones, dias_faltantes = self.cargar_variaciones(
+                    semana_inicio=semana_inicio,
+                    fecha_inicio_filtro=fecha_inicio_filtro,
+                    fecha_fin_filtro=fecha_fin_filtro
+                )
+                
+                # 3-4. Calcular alertas y preparar reporte
+                resultado = self.resultado_desde_variaciones(df_variaciones, dias_faltantes, copiar=False,
+                                                             reabastecimientos=self.reabastecimientos)
+            df_export = resultado.df_export
+            archivo_perfil = self.guardar_perfil()
+            self.logger.info(f"⏱️ Perfil de tiempos guardado: {archivo_perfil}")
             
             # 5. Resumen de alertas críticas
             alertas_criticas = df_export[df_export['Estado'] == '🔴 CRÍTICA']
@@ -848,11 +2596,516 @@ class InventoryAnalyzer:
             self.logger.info("ANÁLISIS COMPLETADO EXITOSAMENTE")
             self.logger.info("="*80)
             
-            return archivo_reporte
+            return resultado
             
         except Exception as e:
             self.logger.error(f"Error en el análisis: {str(e)}", exc_info=True)
             raise
+    
+    def ejecutar_analisis_completo(self, semana_inicio=None, fecha_inicio_filtro=None, 
+                                   fecha_fin_filtro=None):
+        """
+        Ejecuta el proceso completo de análisis y genera el reporte
+        
+        Args:
+            semana_inicio: Fecha de inicio de semana (para modo semana)
+            fecha_inicio_filtro: Fecha inicio para rango personalizado
+            fecha_fin_filtro: Fecha fin para rango personalizado
+        
+        Returns:
+            Ruta del archivo de reporte generado
+        """
+        resultado = self.ejecutar_analisis(
+            semana_inicio=semana_inicio,
+            fecha_inicio_filtro=fecha_inicio_filtro,
+            fecha_fin_filtro=fecha_fin_filtro
+        )
+        return self.guardar_reporte(resultado)
+
+    def cargar_estado_incremental(self):
+        """
+        Carga el estado acumulado del modo incremental desde output_folder
+        
+        Returns:
+            DataFrame de estado (vacío si aún no existe)
+        """
+        if not os.path.exists(self.archivo_estado_incremental):
+            vacio = pd.DataFrame({
+                'nombre_producto': pd.Series(dtype=object),
+                'cantidad_inicial': pd.Series(dtype=float),
+                'cantidad_final': pd.Series(dtype=float),
+                'fecha_inicial': pd.Series(dtype='datetime64[ns]'),
+                'fecha_final': pd.Series(dtype='datetime64[ns]'),
+                'suma_cantidad': pd.Series(dtype=float),
+                'dias_con_registro': pd.Series(dtype=int),
+                'dias_transcurridos': pd.Series(dtype=int),
+                'variacion_maxima_diaria': pd.Series(dtype=float),
+                'consumo_acumulado': pd.Series(dtype=float),
+                'reabastecido_acumulado': pd.Series(dtype=float),
+                'reabastecimientos': pd.Series(dtype=int)
+            })
+            vacio.index.name = 'codigo_producto'
+            return vacio
+        
+        estado = pd.read_parquet(self.archivo_estado_incremental)
+        if 'consumo_acumulado' not in estado.columns:
+            # Estado guardado antes del consumo por diferencias diarias: se estima con inicial - final
+            self.logger.warning("⚠️ Estado incremental sin consumo acumulado, se estima con la variación neta. "
+                                "Reinicialícelo para un consumo exacto")
+            variacion = estado['cantidad_inicial'] - estado['cantidad_final']
+            estado['consumo_acumulado'] = variacion.clip(lower=0)
+            estado['reabastecido_acumulado'] = (-variacion).clip(lower=0)
+            estado['reabastecimientos'] = (variacion < 0).astype(int)
+        if 'dias_transcurridos' not in estado.columns:
+            # Estado guardado antes de contar días operativos: se obtienen de las fechas extremas
+            estado['dias_transcurridos'] = self._dias_operativos_entre(estado['fecha_inicial'], estado['fecha_final'])
+        return estado
+    
+    def guardar_estado_incremental(self, estado):
+        """Persiste el estado acumulado del modo incremental en output_folder"""
+        estado.index.name = 'codigo_producto'
+        estado.to_parquet(self.archivo_estado_incremental)
+    
+    def cargar_eventos_incremental(self):
+        """
+        Carga los eventos de reabastecimiento acumulados del modo incremental
+        
+        Returns:
+            DataFrame de eventos (columnas de MatrizInventario.eventos_reabastecimiento),
+            o None si aún no existe
+        """
+        if not os.path.exists(self.archivo_eventos_incremental):
+            return None
+        return pd.read_parquet(self.archivo_eventos_incremental)
+    
+    def guardar_eventos_incremental(self, eventos):
+        """Persiste los eventos de reabastecimiento del modo incremental en output_folder"""
+        eventos.to_parquet(self.archivo_eventos_incremental, index=False)
+    
+    def inicializar_estado_incremental(self, semana_inicio=None, fecha_inicio_filtro=None,
+                                       fecha_fin_filtro=None):
+        """
+        Crea el estado del modo incremental a partir de una semana o rango de archivos
+        
+        Args:
+            semana_inicio: Fecha de inicio de semana (para modo semana)
+            fecha_inicio_filtro: Fecha inicio para rango personalizado
+            fecha_fin_filtro: Fecha fin para rango personalizado
+            
+        Returns:
+            DataFrame de estado guardado
+        """
+        df_consolidado, _ = self.cargar_archivos_semana(
+            semana_inicio=semana_inicio,
+            fecha_inicio_filtro=fecha_inicio_filtro,
+            fecha_fin_filtro=fecha_fin_filtro
+        )
+        matriz = MatrizInventario.desde_consolidado(df_consolidado)
+        diferencias = matriz.diferencias_diarias()
+        estado = self.estado_desde_matriz(matriz, diferencias)
+        self.guardar_estado_incremental(estado)
+        self.guardar_eventos_incremental(matriz.eventos_reabastecimiento(diferencias))
+        self.logger.info(f"✓ Estado incremental inicializado: {len(estado)} productos hasta {estado['fecha_final'].max().strftime('%Y-%m-%d')}")
+        return estado
+    
+    def ejecutar_analisis_incremental(self, archivo, fecha=None):
+        """
+        Incorpora el archivo de un nuevo día al estado acumulado y genera el reporte
+        sin volver a leer los días anteriores
+        
+        Args:
+            archivo: Ruta del archivo del nuevo día
+            fecha: Fecha del inventario. Si es None se toma del nombre del archivo
+        
+        Returns:
+            Ruta del archivo de reporte generado
+        """
+        try:
+            self.logger.info("="*80)
+            self.logger.info("ANÁLISIS INCREMENTAL DE INVENTARIO")
+            self.logger.info("="*80)
+            
+            if fecha is None:
+                fecha, _ = fecha_desde_nombre(os.path.basename(archivo))
+                if fecha is None:
+                    raise ValueError(f"No se pudo obtener la fecha del nombre de archivo: {os.path.basename(archivo)}")
+            
+            # 1. Leer solo el nuevo día y actualizar el estado acumulado
+            estado = self.cargar_estado_incremental()
+            df_dia, _ = self._leer_archivo_dia(pd.Timestamp(fecha), archivo)
+            estado = self.actualizar_estado(estado, df_dia, fecha)
+            self.guardar_estado_incremental(estado)
+            
+            # Los eventos del día se añaden a los del periodo para que el reporte los liste todos
+            eventos = self.cargar_eventos_incremental()
+            if eventos is not None and len(eventos) > 0:
+                self.reabastecimientos = pd.concat([eventos, self.reabastecimientos], ignore_index=True)
+            self.guardar_eventos_incremental(self.reabastecimientos)
+            self.logger.info(f"📅 Día incorporado: {pd.Timestamp(fecha).strftime('%Y-%m-%d')} - {len(df_dia)} productos ({len(estado)} en el estado)")
+            
+            # 2. Variaciones y alertas a partir del estado
+            df_analisis = self._variaciones_desde_estado(estado)
+            df_analisis = self.calcular_alertas(df_analisis)
+            
+            # 3. Generar reporte
+            archivo_reporte, _ = self.generar_reporte(df_analisis, [], self.reabastecimientos)
+            
+            self.logger.info("="*80)
+            self.logger.info("ANÁLISIS INCREMENTAL COMPLETADO")
+            self.logger.info("="*80)
+            
+            return archivo_reporte
+            
+        except Exception as e:
+            self.logger.error(f"Error en el análisis incremental: {str(e)}", exc_info=True)
+            raise
+
+
+def resolver_sucursales(sucursales):
+    """
+    Normaliza la lista de sucursales del modo por lotes
+    
+    Args:
+        sucursales: Diccionario {nombre: carpeta}, o una carpeta / patrón glob o lista
+                    de ellos (el nombre de cada sucursal es el de su carpeta)
+    
+    Returns:
+        Diccionario {nombre: carpeta} ordenado por nombre
+    """
+    if isinstance(sucursales, dict):
+        return dict(sorted(sucursales.items()))
+    if isinstance(sucursales, (str, os.PathLike)):
+        sucursales = [sucursales]
+    
+    resueltas = {}
+    for patron in sucursales:
+        carpetas = sorted(glob.glob(os.fspath(patron))) if glob.has_magic(os.fspath(patron)) else [os.fspath(patron)]
+        for carpeta in carpetas:
+            if not os.path.isdir(carpeta):
+                continue
+            nombre = os.path.basename(os.path.normpath(carpeta))
+            if nombre in resueltas and os.path.abspath(resueltas[nombre]) != os.path.abspath(carpeta):
+                raise ValueError(f"Dos carpetas de sucursal con el mismo nombre '{nombre}': "
+                                 f"{resueltas[nombre]} y {carpeta}. Use un diccionario {{nombre: carpeta}}")
+            resueltas[nombre] = carpeta
+    return dict(sorted(resueltas.items()))
+
+
+def _analizar_sucursal(nombre, input_folder, output_folder, opciones, periodo, consolidar=False):
+    """
+    Analiza una sucursal en un proceso del pool con su propio logger y guarda su reporte
+    
+    Args:
+        nombre: Nombre de la sucursal
+        input_folder: Carpeta de inventarios de la sucursal
+        output_folder: Carpeta de reportes de la sucursal
+        opciones: Parámetros adicionales de InventoryAnalyzer
+        periodo: Parámetros de ejecutar_analisis (semana_inicio, fecha_inicio_filtro, fecha_fin_filtro)
+        consolidar: Si True, devuelve también las columnas de calcular_alertas que usa consolidar_sucursales
+    
+    Returns:
+        Diccionario con el resumen de la sucursal (con 'error' si el análisis falló)
+    """
+    inicio = time.perf_counter()
+    registro = {'sucursal': nombre, 'error': None, 'archivo_reporte': None, 'resumen': None, 'analisis': None}
+    analyzer = None
+    try:
+        analyzer = InventoryAnalyzer(input_folder=input_folder, output_folder=output_folder,
+                                     nombre_logger=nombre, **opciones)
+        resultado = analyzer.ejecutar_analisis(**periodo)
+        registro['archivo_reporte'] = analyzer.guardar_reporte(resultado)
+        registro['resumen'] = resultado.resumen
+        if consolidar:
+            # Solo las columnas necesarias viajan de vuelta al proceso principal
+            registro['analisis'] = resultado.df_analisis[COLUMNAS_CONSOLIDADO_RED]
+    except Exception as e:
+        registro['error'] = f"{type(e).__name__}: {str(e)}"
+    finally:
+        if analyzer is not None:
+            analyzer.cerrar_logging()
+    registro['segundos'] = round(time.perf_counter() - inicio, 3)
+    return registro
+
+
+def _tramos_acumulados(producto, valores, limite, inicio_producto):
+    """
+    Coloca los valores de cada producto uno tras otro (mayores primero) sobre un eje
+    común a toda la red, recortados a limite[producto]
+    
+    Args:
+        producto: Código de producto de cada fila
+        valores: Unidades enteras de cada fila (0 = no participa)
+        limite: Unidades a repartir por producto
+        inicio_producto: Posición donde empieza cada producto en el eje común
+    
+    Returns:
+        Tupla (filas que participan, fin de cada tramo en el eje común), en orden creciente
+    """
+    filas = np.flatnonzero(valores > 0)
+    filas = filas[np.lexsort((-valores[filas], producto[filas]))]
+    codigos = producto[filas]
+    
+    # Suma acumulada dentro de cada producto: la global menos la acumulada hasta su primera fila
+    acumulado = np.cumsum(valores[filas])
+    primera = np.searchsorted(codigos, codigos, side='left')
+    previo = acumulado[primera] - valores[filas[primera]]
+    fin = np.minimum(acumulado - previo, limite[codigos])
+    inicio = acumulado - previo - valores[filas]
+    
+    # Filas que quedan fuera del límite (el producto ya está cubierto)
+    con_tramo = inicio < limite[codigos]
+    return filas[con_tramo], inicio_producto[codigos[con_tramo]] + fin[con_tramo]
+
+
+def repartir_transferencias(producto, excedente, necesidad, num_productos):
+    """
+    Reparte el excedente de cada producto entre las sucursales que lo necesitan
+    (los mayores excedentes van a las mayores necesidades), sin bucles por producto
+    
+    Los excedentes y las necesidades de todos los productos se ponen sobre un mismo
+    eje acumulado; cada tramo donde coinciden un donante y un receptor es una transferencia.
+    
+    Args:
+        producto: Código de producto de cada fila (fila = producto en una sucursal)
+        excedente: Unidades enteras que la fila puede ceder
+        necesidad: Unidades enteras que le faltan a la fila
+        num_productos: Número de códigos de producto
+    
+    Returns:
+        Tupla (fila donante, fila receptora, cantidad) de arrays, una posición por transferencia
+    """
+    total_excedente = np.bincount(producto, weights=excedente, minlength=num_productos).astype(np.int64)
+    total_necesidad = np.bincount(producto, weights=necesidad, minlength=num_productos).astype(np.int64)
+    transferible = np.minimum(total_excedente, total_necesidad)
+    inicio_producto = np.cumsum(transferible) - transferible
+    
+    donantes, fin_donantes = _tramos_acumulados(producto, excedente, transferible, inicio_producto)
+    receptores, fin_receptores = _tramos_acumulados(producto, necesidad, transferible, inicio_producto)
+    
+    # Los dos repartos cubren exactamente los mismos tramos: cada corte abre una transferencia
+    cortes = np.union1d(fin_donantes, fin_receptores)
+    inicios = np.concatenate([[0], cortes]).astype(np.int64)[:-1]
+    donante = donantes[np.searchsorted(fin_donantes, inicios, side='right')]
+    receptor = receptores[np.searchsorted(fin_receptores, inicios, side='right')]
+    return donante, receptor, cortes - inicios
+
+
+def consolidar_sucursales(analisis_sucursales):
+    """
+    Consolida las tablas de calcular_alertas de varias sucursales en una sola pasada
+    vectorizada (sumas por código con bincount, sin agrupar producto a producto)
+    
+    Una sucursal en 🔴/🟠 necesita su cantidad a reabastecer; una en otro estado puede
+    ceder lo que tiene por encima de su stock mínimo. Lo que no se cubre con
+    transferencias queda como compra sugerida.
+    
+    Args:
+        analisis_sucursales: Diccionario {sucursal: DataFrame de calcular_alertas}
+    
+    Returns:
+        ConsolidadoRed
+    """
+    nombres_sucursal = pd.Index(list(analisis_sucursales))
+    marcos = [analisis_sucursales[nombre][COLUMNAS_CONSOLIDADO_RED] for nombre in nombres_sucursal]
+    
+    # Un solo factorize de los códigos de todas las sucursales (códigos = posición del producto)
+    producto, codigos = pd.factorize(
+        np.concatenate([df['codigo_producto'].astype(str).to_numpy(dtype=object) for df in marcos]), sort=True
+    )
+    nombres = np.concatenate([df['nombre_producto'].astype(str).to_numpy(dtype=object) for df in marcos])
+    sucursal = np.repeat(np.arange(len(marcos)), [len(df) for df in marcos])
+    alerta = np.concatenate([pd.Categorical(df['alerta'], categories=ESTADOS_ALERTA).codes for df in marcos])
+    
+    def columna(nombre):
+        return np.concatenate([df[nombre].to_numpy(dtype=float) for df in marcos])
+    
+    final = columna('cantidad_final')
+    consumo = columna('consumo_promedio_diario')
+    minimo = columna('stock_minimo')
+    
+    num_productos = len(codigos)
+    sin_existencias = alerta == ESTADOS_ALERTA.index(ESTADO_SIN_EXISTENCIAS)
+    bajo_stock = alerta == ESTADOS_ALERTA.index(ESTADO_BAJO_STOCK)
+    en_alerta = sin_existencias | bajo_stock
+    
+    # Unidades enteras: el donante no baja de su mínimo y el receptor llega al suyo
+    excedente = np.where(~en_alerta & (final > minimo), np.floor(final - minimo), 0).astype(np.int64)
+    necesidad = np.where(en_alerta, np.ceil(columna('cantidad_reabastecer')), 0).astype(np.int64)
+    donante, receptor, cantidad = repartir_transferencias(producto, excedente, necesidad, num_productos)
+    
+    def suma(pesos):
+        return np.bincount(producto, weights=pesos, minlength=num_productos)
+    
+    # Nombre de cada producto: el de la primera sucursal en que aparece
+    _, primeras = np.unique(producto, return_index=True)
+    nombre_producto = nombres[primeras]
+    transferido = np.bincount(producto[receptor], weights=cantidad, minlength=num_productos)
+    necesidad_total = suma(necesidad)
+    df_productos = pd.DataFrame({
+        'codigo_producto': codigos,
+        'nombre_producto': nombre_producto,
+        'sucursales': np.bincount(producto, minlength=num_productos),
+        'stock_total': suma(final),
+        'consumo_diario_total': suma(consumo).round(2),
+        'stock_minimo_total': suma(minimo).round(0),
+        'sucursales_sin_existencias': suma(sin_existencias).astype(np.int64),
+        'sucursales_bajo_stock': suma(bajo_stock).astype(np.int64),
+        'cantidad_reabastecer_total': necesidad_total.astype(np.int64),
+        'unidades_transferibles': transferido.astype(np.int64),
+        'compra_sugerida': (necesidad_total - transferido).astype(np.int64)
+    })
+    # Productos con más sucursales en alerta primero
+    df_productos = df_productos.sort_values(
+        ['sucursales_sin_existencias', 'sucursales_bajo_stock', 'codigo_producto'],
+        ascending=[False, False, True], ignore_index=True
+    )
+    
+    df_transferencias = pd.DataFrame({
+        'codigo_producto': codigos.take(producto[donante]),
+        'nombre_producto': nombre_producto.take(producto[donante]),
+        'sucursal_origen': nombres_sucursal.take(sucursal[donante]),
+        'sucursal_destino': nombres_sucursal.take(sucursal[receptor]),
+        'cantidad': cantidad
+    }).sort_values(['codigo_producto', 'cantidad'], ascending=[True, False], ignore_index=True)
+    
+    return ConsolidadoRed(productos=df_productos, transferencias=df_transferencias)
+
+
+def _registrar_sucursales(completados, logger):
+    """Registra en el log cada sucursal a medida que termina y las devuelve ordenadas por nombre"""
+    registros = []
+    for registro in completados:
+        if registro['error'] is None:
+            logger.info(f"  ✓ {registro['sucursal']} ({registro['segundos']:.1f} s)")
+        else:
+            logger.info(f"  ✗ {registro['sucursal']} ({registro['segundos']:.1f} s): {registro['error']}")
+        registros.append(registro)
+    return sorted(registros, key=lambda r: r['sucursal'])
+
+
+def resumen_red(registros):
+    """
+    Tabla con una fila por sucursal y una fila final con el total de la red
+    
+    Args:
+        registros: Lista de diccionarios devueltos por _analizar_sucursal
+    
+    Returns:
+        DataFrame del resumen de la red
+    """
+    claves = [
+        ('total_productos', 'Productos'),
+        ('sin_existencias', 'Sin Existencias'),
+        ('bajo_stock', 'Bajo Stock'),
+        ('en_descenso', 'En Descenso'),
+        ('normales', 'Normales'),
+        ('revisar', 'Revisar'),
+        ('total_reabastecer', 'Unidades a Reabastecer'),
+        ('dias_analizados', 'Días Analizados')
+    ]
+    filas = []
+    for registro in registros:
+        resumen = registro['resumen'] or {}
+        fila = {'Sucursal': registro['sucursal'],
+                'Estado del Análisis': 'OK' if registro['error'] is None else registro['error']}
+        for clave, columna in claves:
+            fila[columna] = resumen.get(clave)
+        fila['Días Sin Archivo'] = len(resumen['dias_sin_archivo']) if resumen else None
+        fila['Segundos'] = registro['segundos']
+        fila['Reporte'] = registro['archivo_reporte']
+        filas.append(fila)
+    
+    df_red = pd.DataFrame(filas, columns=['Sucursal', 'Estado del Análisis'] + [c for _, c in claves] +
+                          ['Días Sin Archivo', 'Segundos', 'Reporte'])
+    correctas = sum(registro['error'] is None for registro in registros)
+    total = {'Sucursal': 'TOTAL RED', 'Estado del Análisis': f"{correctas} de {len(registros)} OK"}
+    for columna in ['Productos', 'Sin Existencias', 'Bajo Stock', 'En Descenso', 'Normales',
+                    'Revisar', 'Unidades a Reabastecer']:
+        total[columna] = df_red[columna].sum()
+    total['Segundos'] = df_red['Segundos'].sum()
+    df_red = pd.concat([df_red, pd.DataFrame([total])], ignore_index=True)
+    
+    # Enteros con nulos (sucursales con error) en lugar de float
+    enteras = [c for _, c in claves] + ['Días Sin Archivo']
+    df_red[enteras] = df_red[enteras].astype('Int64')
+    return df_red
+
+
+def analizar_sucursales(sucursales, output_folder='./reportes_red', workers=None,
+                        semana_inicio=None, fecha_inicio_filtro=None, fecha_fin_filtro=None,
+                        consolidar=True, **opciones):
+    """
+    Modo por lotes: analiza muchas sucursales en un solo proceso padre, repartiéndolas
+    en un pool de procesos (pandas se importa una vez por proceso, no por sucursal)
+    
+    Cada sucursal escribe su reporte, log y perfil en output_folder/<sucursal>, con un
+    logger propio. Al final se escribe el resumen de toda la red en output_folder y,
+    si consolidar es True, el stock por producto de toda la red y las transferencias
+    sugeridas entre sucursales (consolidar_sucursales).
+    
+    Args:
+        sucursales: Diccionario {nombre: carpeta}, o carpeta / patrón glob o lista de ellos
+        output_folder: Carpeta de salida de la red
+        workers: Número de procesos (None = número de núcleos, 1 = secuencial)
+        semana_inicio: Fecha de inicio de semana (para modo semana)
+        fecha_inicio_filtro: Fecha inicio para rango personalizado
+        fecha_fin_filtro: Fecha fin para rango personalizado
+        consolidar: Si True, consolida los productos de todas las sucursales
+        **opciones: Parámetros adicionales de InventoryAnalyzer (iguales para todas las sucursales)
+    
+    Returns:
+        Tupla (DataFrame del resumen de la red, ConsolidadoRed o None, ruta del archivo de resumen)
+    """
+    sucursales = resolver_sucursales(sucursales)
+    if not sucursales:
+        raise FileNotFoundError("No se encontró ninguna carpeta de sucursal")
+    
+    output_format = opciones.get('output_format', 'excel')
+    if output_format not in EXTENSIONES_FORMATO:
+        raise ValueError(f"Formato de salida no soportado: {output_format}")
+    
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    logger = logging.getLogger(__name__)
+    periodo = dict(semana_inicio=semana_inicio, fecha_inicio_filtro=fecha_inicio_filtro,
+                   fecha_fin_filtro=fecha_fin_filtro)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sucursales)))
+    logger.info(f"🏥 Análisis por lotes: {len(sucursales)} sucursales con {workers} procesos")
+    
+    inicio = time.perf_counter()
+    tareas = [
+        (nombre, carpeta, os.path.join(output_folder, nombre), opciones, periodo, consolidar)
+        for nombre, carpeta in sucursales.items()
+    ]
+    if workers == 1:
+        completados = (_analizar_sucursal(*tarea) for tarea in tareas)
+        registros = _registrar_sucursales(completados, logger)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futuros = [executor.submit(_analizar_sucursal, *tarea) for tarea in tareas]
+            completados = (futuro.result() for futuro in as_completed(futuros))
+            registros = _registrar_sucursales(completados, logger)
+    
+    df_red = resumen_red(registros)
+    tablas = [('Resumen Red', '', df_red)]
+    
+    consolidado = None
+    analisis = {r['sucursal']: r.pop('analisis') for r in registros if r['analisis'] is not None}
+    if consolidar and analisis:
+        consolidado = consolidar_sucursales(analisis)
+        del analisis
+        tablas += consolidado.tablas()
+        logger.info(f"🔄 Red consolidada: {len(consolidado.productos)} productos, "
+                    f"{len(consolidado.transferencias)} transferencias sugeridas")
+    
+    fecha_reporte = datetime.now().strftime('%Y%m%d_%H%M%S')
+    archivo_red = os.path.join(output_folder, f'resumen_red_{fecha_reporte}{EXTENSIONES_FORMATO[output_format]}')
+    exportar_tablas(tablas, archivo_red, output_format)
+    
+    fallidas = [r['sucursal'] for r in registros if r['error'] is not None]
+    if fallidas:
+        logger.warning(f"⚠️ {len(fallidas)} sucursales con error: {', '.join(fallidas)}")
+    logger.info(f"✓ Red analizada en {time.perf_counter() - inicio:.1f} s. Resumen: {archivo_red}")
+    return df_red, consolidado, archivo_red
 
 
 # ============================================================================
@@ -861,6 +3114,22 @@ class InventoryAnalyzer:
 
 if __name__ == "__main__":
     
+    # ========================================================================
+    # MODO POR LOTES (varias sucursales)
+    # Uso: python script_analisis.py "sucursales/*"
+    # ========================================================================
+    if len(sys.argv) > 1:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        df_red, consolidado, archivo_red = analizar_sucursales(
+            sys.argv[1:],
+            output_folder='./reportes_red',
+            incluir_fines_semana=True,
+            output_format='excel'
+        )
+        print(df_red.to_string(index=False))
+        print(f"\n📊 Resumen de la red: {archivo_red}")
+        sys.exit(0)
+    
     # ========================================================================
     # CONFIGURACIÓN DEL ANALIZADOR
     # ========================================================================
@@ -872,9 +3141,12 @@ if __name__ == "__main__":
         # CONFIGURACIÓN DE STOCK MÍNIMO
         stock_minimo_global=100,           # Stock mínimo por defecto (si no se usa promedio)
         usar_promedio_semanal=True,        # True: usa promedio semanal * factor
-        factor_promedio=0.5                # 0.5 = media semana de demanda
+        factor_promedio=0.5,               # 0.5 = media semana de demanda
                                            # 1.0 = una semana completa
                                            # 0.3 = 30% del promedio
+        
+        # FORMATO DEL REPORTE
+        output_format='excel'              # 'excel', 'parquet', 'csv' o 'jsonl'
     )
     
     # ========================================================================